@@ -0,0 +1,36 @@
+"""
+Size-bounded LRU cache of rendered chart images (PNG bytes).
+Images are keyed by dataset fingerprint and chart spec, so the dashboard's box
+plots and the PDF report's figures are rendered once per dataset and reused by
+every later request.
+"""
+
+import hashlib
+import json
+import os
+
+from lru_cache import LRUCache
+
+CHART_IMAGE_CACHE_MB = int(os.environ.get("CHART_IMAGE_CACHE_MB", "128"))
+
+
+def image_key(fingerprint, spec):
+    """Cache key for the image of spec (a JSON-able dict) rendered from a dataset."""
+    encoded = json.dumps(spec, sort_keys=True, default=str)
+    return hashlib.sha256(f"{fingerprint}:{encoded}".encode("utf-8")).hexdigest()
+
+
+class ChartImageCache(LRUCache):
+    """Thread-safe LRU mapping of image keys to PNG bytes, bounded by total size."""
+
+    def __init__(self, max_bytes):
+        super().__init__(max_bytes=max_bytes)
+
+    def stats(self):
+        stats = super().stats()
+        stats["images"] = stats.pop("entries")
+        return stats
+
+
+# Shared by the render pool (dashboard images) and the PDF report
+chart_images = ChartImageCache(CHART_IMAGE_CACHE_MB * 1024 * 1024)
@@ -1,11 +1,217 @@
 import pandas as pd
 import numpy as np
 
-def recommend_charts(columns, df):
+# Scatter plots send raw points up to this many rows, and a density grid above it
+SCATTER_RAW_POINT_LIMIT = 1000
+# Bins per axis of the density grid (payload is at most SCATTER_GRID_BINS ** 2 cells)
+SCATTER_GRID_BINS = 40
+# Raw outlier points kept alongside the density grid
+SCATTER_MAX_OUTLIERS = 200
+
+
+def build_scatter_data(df, x_col, y_col):
+    """
+    Build the data frame for a scatter chart of x_col against y_col.
+    Small frames keep every raw point. Larger frames are binned into a
+    SCATTER_GRID_BINS x SCATTER_GRID_BINS 2-D histogram computed over all rows,
+    so the payload size stays constant while every row is counted; points
+    outside the IQR fences on either axis are kept raw as outliers, the
+    furthest out first when there are more than SCATTER_MAX_OUTLIERS.
+    """
+    points = df[[x_col, y_col]].dropna()
+
+    if len(points) <= SCATTER_RAW_POINT_LIMIT:
+        return {
+            "mode": "points",
+            "data": points
+        }
+
+    x_values = points[x_col].to_numpy(dtype=float)
+    y_values = points[y_col].to_numpy(dtype=float)
+
+    counts, x_edges, y_edges = np.histogram2d(x_values, y_values, bins=SCATTER_GRID_BINS)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+
+    # Only non-empty cells are sent
+    x_idx, y_idx = np.nonzero(counts)
+    cells = pd.DataFrame({
+        x_col: np.round(x_centers[x_idx], 4),
+        y_col: np.round(y_centers[y_idx], 4),
+        "count": counts[x_idx, y_idx].astype(int)
+    })
+
+    # Distance beyond the IQR fences, in IQRs, on whichever axis is further out
+    distance = np.zeros(len(points))
+    for values in (x_values, y_values):
+        q1, q3 = np.percentile(values, [25, 75])
+        iqr = q3 - q1
+        beyond = np.maximum(q1 - 1.5 * iqr - values, values - (q3 + 1.5 * iqr))
+        distance = np.maximum(distance, beyond / (iqr or 1))
+    # The most extreme outliers are kept when there are more than the limit
+    outlier_idx = np.flatnonzero(distance > 0)
+    outlier_idx = outlier_idx[np.argsort(-distance[outlier_idx], kind="stable")[:SCATTER_MAX_OUTLIERS]]
+    outliers = points.iloc[outlier_idx]
+
+    return {
+        "mode": "binned",
+        "data": cells,
+        "outliers": outliers.to_dict(orient="records"),
+        "bins": {
+            "x": np.round(x_edges, 4).tolist(),
+            "y": np.round(y_edges, 4).tolist()
+        },
+        "total_points": int(len(points))
+    }
+
+def _line_data(chart, df):
+    date_col, num_col = chart["x"], chart["y"]
+    # Sort by date for line chart
+    chart_data = df.sort_values(by=date_col)[[date_col, num_col]].dropna().head(500)
+    return {"data": chart_data}
+
+
+def _aggregate_bar_data(chart, df):
+    cat_col, num_col = chart["x"], chart["y"]
+    if chart["aggregation"] == "mean":
+        agg_data = df.groupby(cat_col)[num_col].mean().reset_index()
+        agg_data[num_col] = agg_data[num_col].round(2)
+    elif chart.get("limit"):
+        # Top N for high cardinality
+        agg_data = df.groupby(cat_col)[num_col].sum().nlargest(chart["limit"]).reset_index()
+    else:
+        agg_data = df.groupby(cat_col)[num_col].sum().reset_index()
+        agg_data = agg_data.sort_values(by=num_col, ascending=False)
+    return {"data": agg_data}
+
+
+def _value_count_data(chart, df):
+    cat_col = chart["column"]
+    counts = df[cat_col].value_counts()
+    if chart.get("limit"):
+        counts = counts.head(chart["limit"])
+    counts = counts.reset_index()
+    counts.columns = [cat_col, "count"]
+    return {"data": counts}
+
+
+def _stacked_bar_data(chart, df):
+    pivot_data = df.pivot_table(
+        values=chart["y"],
+        index=chart["x"],
+        columns=chart["stackKey"],
+        aggfunc='sum',
+        fill_value=0
+    ).reset_index()
+    return {"data": pivot_data}
+
+
+def _histogram_data(chart, df):
+    col_data = df[chart["column"]].dropna()
+    counts, bin_edges = np.histogram(col_data, bins='auto')
+
+    # Limit bins for readability
+    if len(counts) > 20:
+        counts, bin_edges = np.histogram(col_data, bins=20)
+
+    labels = [f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}" for i in range(len(counts))]
+    return {"data": pd.DataFrame({"range": labels, "count": counts.astype(int)})}
+
+
+def _heatmap_data(chart, df):
+    corr_matrix = df[chart["columns"]].corr().round(3)
+    heatmap_data = []
+    for i, row_col in enumerate(corr_matrix.index):
+        for j, col_col in enumerate(corr_matrix.columns):
+            heatmap_data.append({
+                "x": col_col,
+                "y": row_col,
+                "value": corr_matrix.iloc[i, j]
+            })
+    return {"data": pd.DataFrame(heatmap_data, columns=["x", "y", "value"])}
+
+
+def _box_plot_data(chart, df):
+    num_col = chart["column"]
+    col_data = df[num_col].dropna()
+    q1 = col_data.quantile(0.25)
+    q3 = col_data.quantile(0.75)
+    median = col_data.median()
+    iqr = q3 - q1
+    whisker_low = max(col_data.min(), q1 - 1.5 * iqr)
+    whisker_high = min(col_data.max(), q3 + 1.5 * iqr)
+    outliers = col_data[(col_data < whisker_low) | (col_data > whisker_high)].tolist()[:50]
+    return {"data": pd.DataFrame([{
+        "name": num_col,
+        "min": round(whisker_low, 2),
+        "q1": round(q1, 2),
+        "median": round(median, 2),
+        "q3": round(q3, 2),
+        "max": round(whisker_high, 2),
+        "outliers": [round(o, 2) for o in outliers]
+    }])}
+
+
+def _bar_data(chart, df):
+    if chart.get("aggregation") == "count":
+        return _value_count_data(chart, df)
+    return _aggregate_bar_data(chart, df)
+
+
+# Chart type -> builder of that chart's data fields from the full dataframe.
+# Builders return "data" as a DataFrame so it can be paged and encoded per request.
+# Box plots rendered as seaborn images keep their statistics under "image".
+CHART_DATA_BUILDERS = {
+    "line": _line_data,
+    "area": _line_data,
+    "bar": _bar_data,
+    "horizontalBar": _value_count_data,
+    "pie": _value_count_data,
+    "donut": _value_count_data,
+    "stackedBar": _stacked_bar_data,
+    "scatter": lambda chart, df: build_scatter_data(df, chart["x"], chart["y"]),
+    "histogram": _histogram_data,
+    "heatmap": _heatmap_data,
+    "boxPlot": _box_plot_data,
+    "image": _box_plot_data,
+}
+
+
+def build_chart_frame(chart, df):
+    """
+    Materialize the data fields of a chart spec produced by recommend_charts.
+    Returns a dict holding at least "data" as a DataFrame; scatter charts add
+    their mode, outliers and bin edges.
+    """
+    builder = CHART_DATA_BUILDERS.get(chart.get("type"))
+    if builder is None:
+        raise ValueError(f"Unsupported chart type: {chart.get('type')}")
+    return builder(chart, df)
+
+
+def chart_frame_to_records(frame):
+    """Row records for a chart data frame, with datetime columns as strings."""
+    datetime_cols = frame.select_dtypes(include=["datetime", "datetimetz"]).columns
+    if len(datetime_cols):
+        frame = frame.copy()
+        for col in datetime_cols:
+            frame[col] = frame[col].astype(str)
+    return frame.to_dict(orient="records")
+
+
+def build_chart_data(chart, df):
+    """Same as build_chart_frame, with "data" as a list of row records."""
+    chart_data = build_chart_frame(chart, df)
+    return {**chart_data, "data": chart_frame_to_records(chart_data["data"])}
+
+
+def recommend_charts(columns, df, include_data=True):
     """
     Generates chart recommendations based on column types.
     columns: dict with 'numeric', 'categorical', 'datetime' keys.
     df: The dataframe to calculate bins or aggregates.
+    include_data: When False, only the chart specs (with their ids) are
+        returned and each chart's data is left to build_chart_data.
     """
     recommendations = []
     
@@ -16,19 +222,14 @@ def recommend_charts(columns, df):
     # 1. Date + Numeric -> Line Chart (Trend) & Area Chart
     if datetime_cols and numeric_cols:
         date_col = datetime_cols[0]
-        # Sort by date for line chart
-        df_sorted = df.sort_values(by=date_col)
         
         for num_col in numeric_cols[:3]:  # Limit to first 3 numeric columns
             # Line chart
-            chart_data = df_sorted[[date_col, num_col]].dropna().head(500)
-            chart_data[date_col] = chart_data[date_col].astype(str)
             recommendations.append({
                 "type": "line",
                 "x": date_col,
                 "y": num_col,
-                "title": f"Trend of {num_col} over time",
-                "data": chart_data.to_dict(orient="records")
+                "title": f"Trend of {num_col} over time"
             })
             
             # Area chart for first numeric column only
@@ -37,8 +238,7 @@ def recommend_charts(columns, df):
                     "type": "area",
                     "x": date_col,
                     "y": num_col,
-                    "title": f"{num_col} Area Chart",
-                    "data": chart_data.to_dict(orient="records")
+                    "title": f"{num_col} Area Chart"
                 })
     
     # 2. Categorical + Numeric -> Aggregated Bar Chart & Stacked Bar
@@ -49,39 +249,32 @@ def recommend_charts(columns, df):
         if unique_count <= 15:
             for num_col in numeric_cols[:2]:
                 # Sum aggregation bar chart
-                agg_data = df.groupby(cat_col)[num_col].sum().reset_index()
-                agg_data = agg_data.sort_values(by=num_col, ascending=False)
                 recommendations.append({
                     "type": "bar",
                     "x": cat_col,
                     "y": num_col,
                     "aggregation": "sum",
-                    "title": f"Total {num_col} by {cat_col}",
-                    "data": agg_data.to_dict(orient="records")
+                    "title": f"Total {num_col} by {cat_col}"
                 })
                 
                 # Mean aggregation bar chart
-                agg_mean = df.groupby(cat_col)[num_col].mean().reset_index()
-                agg_mean[num_col] = agg_mean[num_col].round(2)
                 recommendations.append({
                     "type": "bar",
                     "x": cat_col,
                     "y": num_col,
                     "aggregation": "mean",
-                    "title": f"Average {num_col} by {cat_col}",
-                    "data": agg_mean.to_dict(orient="records")
+                    "title": f"Average {num_col} by {cat_col}"
                 })
         else:
             # Top 10 for high cardinality
             for num_col in numeric_cols[:2]:
-                agg_data = df.groupby(cat_col)[num_col].sum().nlargest(10).reset_index()
                 recommendations.append({
                     "type": "bar",
                     "x": cat_col,
                     "y": num_col,
                     "aggregation": "sum",
-                    "title": f"Top 10 {cat_col} by Total {num_col}",
-                    "data": agg_data.to_dict(orient="records")
+                    "limit": 10,
+                    "title": f"Top 10 {cat_col} by Total {num_col}"
                 })
         
         # Stacked bar chart if multiple categorical columns
@@ -89,65 +282,37 @@ def recommend_charts(columns, df):
             cat_col2 = categorical_cols[1]
             num_col = numeric_cols[0]
             if df[cat_col].nunique() <= 10 and df[cat_col2].nunique() <= 5:
-                pivot_data = df.pivot_table(
-                    values=num_col, 
-                    index=cat_col, 
-                    columns=cat_col2, 
-                    aggfunc='sum',
-                    fill_value=0
-                ).reset_index()
                 recommendations.append({
                     "type": "stackedBar",
                     "x": cat_col,
                     "stackKey": cat_col2,
                     "y": num_col,
                     "title": f"{num_col} by {cat_col} (stacked by {cat_col2})",
-                    "data": pivot_data.to_dict(orient="records"),
                     "stackCategories": df[cat_col2].unique().tolist()[:5]
                 })
             
     # 3. Numeric + Numeric -> Scatter Plot with correlation info
     if len(numeric_cols) >= 2:
-        sample_df = df if len(df) < 500 else df.sample(500)
-        
-        # Calculate correlation
-        corr = df[numeric_cols[0]].corr(df[numeric_cols[1]])
-        
-        recommendations.append({
-            "type": "scatter",
-            "x": numeric_cols[0],
-            "y": numeric_cols[1],
-            "title": f"{numeric_cols[0]} vs {numeric_cols[1]} (r={corr:.2f})",
-            "data": sample_df[[numeric_cols[0], numeric_cols[1]]].dropna().to_dict(orient="records"),
-            "correlation": round(corr, 3) if not np.isnan(corr) else None
-        })
-        
+        scatter_pairs = [(numeric_cols[0], numeric_cols[1])]
         # Add more scatter plots for first 3 combinations
         if len(numeric_cols) >= 3:
-            corr2 = df[numeric_cols[0]].corr(df[numeric_cols[2]])
+            scatter_pairs.append((numeric_cols[0], numeric_cols[2]))
+
+        for x_col, y_col in scatter_pairs:
+            # Calculate correlation
+            corr = df[x_col].corr(df[y_col])
             recommendations.append({
                 "type": "scatter",
-                "x": numeric_cols[0],
-                "y": numeric_cols[2],
-                "title": f"{numeric_cols[0]} vs {numeric_cols[2]} (r={corr2:.2f})",
-                "data": sample_df[[numeric_cols[0], numeric_cols[2]]].dropna().to_dict(orient="records"),
-                "correlation": round(corr2, 3) if not np.isnan(corr2) else None
+                "x": x_col,
+                "y": y_col,
+                "title": f"{x_col} vs {y_col} (r={corr:.2f})",
+                "correlation": round(corr, 3) if not np.isnan(corr) else None
             })
 
     # 4. 1 Numeric -> Histogram with statistics
     for num_col in numeric_cols[:3]:
         try:
             col_data = df[num_col].dropna()
-            counts, bin_edges = np.histogram(col_data, bins='auto')
-            
-            # Limit bins for readability
-            if len(counts) > 20:
-                counts, bin_edges = np.histogram(col_data, bins=20)
-            
-            hist_data = []
-            for i in range(len(counts)):
-                label = f"{bin_edges[i]:.1f}-{bin_edges[i+1]:.1f}"
-                hist_data.append({"range": label, "count": int(counts[i])})
             
             # Calculate statistics
             stats = {
@@ -164,7 +329,6 @@ def recommend_charts(columns, df):
                 "y": "count",
                 "column": num_col,
                 "title": f"Distribution of {num_col}",
-                "data": hist_data,
                 "statistics": stats
             })
         except:
@@ -176,98 +340,73 @@ def recommend_charts(columns, df):
         
         if unique_count <= 5:
             # Donut Chart (better than pie for comparison)
-            counts = df[cat_col].value_counts().reset_index()
-            counts.columns = [cat_col, "count"]
             recommendations.append({
                 "type": "donut",
                 "x": cat_col,
                 "y": "count",
-                "title": f"Distribution of {cat_col}",
-                "data": counts.to_dict(orient="records")
+                "column": cat_col,
+                "aggregation": "count",
+                "title": f"Distribution of {cat_col}"
             })
         elif unique_count <= 10:
             # Pie Chart
-            counts = df[cat_col].value_counts().reset_index()
-            counts.columns = [cat_col, "count"]
             recommendations.append({
                 "type": "pie",
                 "x": cat_col,
                 "y": "count",
-                "title": f"Distribution of {cat_col}",
-                "data": counts.to_dict(orient="records")
+                "column": cat_col,
+                "aggregation": "count",
+                "title": f"Distribution of {cat_col}"
             })
         elif unique_count <= 20:
             # Bar Chart
-            counts = df[cat_col].value_counts().reset_index()
-            counts.columns = [cat_col, "count"]
             recommendations.append({
                 "type": "bar",
                 "x": cat_col,
                 "y": "count",
-                "title": f"Count of {cat_col}",
-                "data": counts.to_dict(orient="records")
+                "column": cat_col,
+                "aggregation": "count",
+                "title": f"Count of {cat_col}"
             })
         else:
             # Top 10 Horizontal Bar Chart (better for long labels)
-            counts = df[cat_col].value_counts().head(10).reset_index()
-            counts.columns = [cat_col, "count"]
             recommendations.append({
                 "type": "horizontalBar",
                 "x": "count",
                 "y": cat_col,
-                "title": f"Top 10 {cat_col}",
-                "data": counts.to_dict(orient="records")
+                "column": cat_col,
+                "aggregation": "count",
+                "limit": 10,
+                "title": f"Top 10 {cat_col}"
             })
 
     # 6. Correlation Heatmap (if multiple numeric columns)
     if len(numeric_cols) >= 3:
-        try:
-            corr_matrix = df[numeric_cols].corr().round(3)
-            heatmap_data = []
-            for i, row_col in enumerate(corr_matrix.index):
-                for j, col_col in enumerate(corr_matrix.columns):
-                    heatmap_data.append({
-                        "x": col_col,
-                        "y": row_col,
-                        "value": corr_matrix.iloc[i, j]
-                    })
-            
-            recommendations.append({
-                "type": "heatmap",
-                "title": "Correlation Matrix",
-                "data": heatmap_data,
-                "columns": numeric_cols
-            })
-        except:
-            pass
+        recommendations.append({
+            "type": "heatmap",
+            "title": "Correlation Matrix",
+            "columns": numeric_cols
+        })
 
     # 7. Box Plot for numeric columns (outlier visualization)
     for num_col in numeric_cols[:2]:
+        recommendations.append({
+            "type": "boxPlot",
+            "column": num_col,
+            "title": f"Box Plot of {num_col}"
+        })
+
+    for idx, chart in enumerate(recommendations):
+        chart["id"] = f"chart-{idx}"
+
+    if not include_data:
+        return recommendations
+
+    charts = []
+    for chart in recommendations:
         try:
-            col_data = df[num_col].dropna()
-            q1 = col_data.quantile(0.25)
-            q3 = col_data.quantile(0.75)
-            median = col_data.median()
-            iqr = q3 - q1
-            whisker_low = max(col_data.min(), q1 - 1.5 * iqr)
-            whisker_high = min(col_data.max(), q3 + 1.5 * iqr)
-            outliers = col_data[(col_data < whisker_low) | (col_data > whisker_high)].tolist()[:50]
-            
-            recommendations.append({
-                "type": "boxPlot",
-                "column": num_col,
-                "title": f"Box Plot of {num_col}",
-                "data": [{
-                    "name": num_col,
-                    "min": round(whisker_low, 2),
-                    "q1": round(q1, 2),
-                    "median": round(median, 2),
-                    "q3": round(q3, 2),
-                    "max": round(whisker_high, 2),
-                    "outliers": [round(o, 2) for o in outliers]
-                }]
-            })
+            chart.update(build_chart_data(chart, df))
         except:
-            pass
-
-    return recommendations
+            continue
+        charts.append(chart)
+    return charts
@@ -0,0 +1,79 @@
+"""
+Bounded cache of LLM chat answers with a time to live.
+Answers are keyed by dataset fingerprint, normalised question and the user's
+earlier questions, so the suggested questions most users click are answered
+once per dataset. Follow-ups that refer back to the conversation ("why is
+that?", "what about London?") depend on earlier answers and bypass the cache.
+"""
+
+import hashlib
+import json
+import os
+import re
+
+from lru_cache import LRUCache
+
+CHAT_CACHE_ENTRIES = int(os.environ.get("CHAT_CACHE_ENTRIES", "1000"))
+CHAT_CACHE_TTL_SECONDS = int(os.environ.get("CHAT_CACHE_TTL_SECONDS", "3600"))
+
+# Words that refer back to the conversation rather than to the dataset
+FOLLOW_UP = re.compile(
+    r"^(and|but|also|so|then|why|how come)\b|\b(it|its|that|this|these|those|them|they|above|previous|"
+    r"previously|earlier|again|elaborate|same|instead|what about|how about|you said|your answer)\b",
+    re.IGNORECASE,
+)
+# "this dataset" and the like name the dataset, not an earlier answer
+DATASET_REFERENCE = re.compile(r"\b(this|the|these|that)\s+(data\s*set|dataset|data|file|table)\b", re.IGNORECASE)
+
+
+def normalize_question(question):
+    """Lower-cased question with whitespace collapsed and end punctuation removed."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!.").strip().lower()
+
+
+def is_follow_up(question, history):
+    """Whether the question relies on an earlier turn of the conversation."""
+    if not any(turn.get("role") == "user" for turn in history or []):
+        return False
+    return bool(FOLLOW_UP.search(DATASET_REFERENCE.sub(" ", question)))
+
+
+def answer_key(fingerprint, question, history):
+    """
+    Cache key for the answer to a question about a dataset, or None when the
+    question is a follow-up that must not be cached. The user's earlier
+    questions are part of the key; assistant turns follow from them.
+    """
+    if is_follow_up(question, history):
+        return None
+    asked = [normalize_question(turn.get("content", "")) for turn in history or [] if turn.get("role") == "user"]
+    encoded = json.dumps([fingerprint, normalize_question(question), asked])
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ChatAnswerCache(LRUCache):
+    """Thread-safe LRU mapping of answer keys to answers, bounded by count and age."""
+
+    def __init__(self, max_entries, ttl_seconds):
+        super().__init__(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.bypassed = 0
+
+    def get(self, key):
+        """The cached answer, or None. A None key is a bypassed follow-up."""
+        if key is None:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        return super().get(key)
+
+    def put(self, key, answer):
+        if key is not None:
+            super().put(key, answer)
+
+    def stats(self):
+        stats = super().stats()
+        stats["bypassed"] = self.bypassed
+        return stats
+
+
+chat_answers = ChatAnswerCache(CHAT_CACHE_ENTRIES, CHAT_CACHE_TTL_SECONDS)
@@ -3,111 +3,141 @@ Chatbot module for interacting with datasets using Groq API.
 Allows users to ask questions about their data and get AI-powered insights.
 """
 
-from openai import OpenAI
+import asyncio
 import os
+import re
+import numpy as np
 import pandas as pd
 import json
 
-# Initialize Groq client
-def get_groq_client():
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
-        raise ValueError("GROQ_API_KEY environment variable is not set")
-    
-    return OpenAI(
-        api_key=api_key,
-        base_url="https://api.groq.com/openai/v1",
-    )
+from llm_client import llm
+
+# Size limit of the data context in a chat prompt, in tokens (estimated at
+# CHARS_PER_TOKEN characters each)
+CHAT_CONTEXT_MAX_TOKENS = int(os.environ.get("CHAT_CONTEXT_MAX_TOKENS", "3000"))
+CHARS_PER_TOKEN = 4
+# Columns whose statistics are always in the context, budget permitting
+DEFAULT_NUMERIC_COLUMNS = 5
+DEFAULT_CATEGORICAL_COLUMNS = 3
 
-def generate_data_context(df, columns, summary, insights):
+
+class DataContext:
     """
-    Generate a context string describing the dataset for the AI.
+    Description of a dataset for the AI, built once per analysis. The overview,
+    insights and sample rows are rendered up front; the statistics of each
+    column are computed the first time a prompt includes that column.
     """
-    context = []
-    
-    # Dataset overview
-    context.append(f"Dataset Overview:")
-    context.append(f"- Total rows: {len(df)}")
-    context.append(f"- Total columns: {len(df.columns)}")
-    context.append(f"- Column names: {', '.join(df.columns.tolist())}")
-    
-    # Column types
-    context.append(f"\nColumn Types:")
-    context.append(f"- Numeric columns: {', '.join(columns.get('numeric', []))}")
-    context.append(f"- Categorical columns: {', '.join(columns.get('categorical', []))}")
-    context.append(f"- Datetime columns: {', '.join(columns.get('datetime', []))}")
-    
-    # Summary statistics
-    if summary:
-        context.append(f"\nSummary Statistics:")
-        for key, value in summary.items():
-            if key != 'total_rows':
-                context.append(f"- {key}: {value}")
-    
-    # Key insights
-    if insights:
-        context.append(f"\nKey Insights from the data:")
-        for insight in insights[:10]:  # Limit to 10 insights
-            context.append(f"- {insight}")
-    
-    # Sample data (first 5 rows)
-    context.append(f"\nSample Data (first 5 rows):")
-    sample_df = df.head(5).fillna('N/A')
-    for idx, row in sample_df.iterrows():
-        row_str = ", ".join([f"{col}: {val}" for col, val in row.items()])
-        context.append(f"  Row {idx + 1}: {row_str}")
-    
-    # Descriptive statistics for numeric columns
-    numeric_cols = columns.get('numeric', [])
-    if numeric_cols:
-        context.append(f"\nNumeric Column Statistics:")
-        for col in numeric_cols[:5]:  # Limit to 5 columns
-            if col in df.columns:
-                col_data = df[col].dropna()
-                context.append(f"  {col}:")
-                context.append(f"    - Mean: {col_data.mean():.2f}")
-                context.append(f"    - Median: {col_data.median():.2f}")
-                context.append(f"    - Min: {col_data.min():.2f}")
-                context.append(f"    - Max: {col_data.max():.2f}")
-                context.append(f"    - Std Dev: {col_data.std():.2f}")
-    
-    # Value counts for categorical columns
-    categorical_cols = columns.get('categorical', [])
-    if categorical_cols:
-        context.append(f"\nCategorical Column Value Counts:")
-        for col in categorical_cols[:3]:  # Limit to 3 columns
-            if col in df.columns:
-                value_counts = df[col].value_counts().head(5)
-                context.append(f"  {col} (top 5):")
+
+    def __init__(self, df, columns, summary, insights, fingerprint=None):
+        self.df = df
+        self.columns = columns or {}
+        self.fingerprint = fingerprint
+        self.numeric = [col for col in self.columns.get('numeric', []) if col in df.columns]
+        self.categorical = [col for col in self.columns.get('categorical', []) if col in df.columns]
+        self.overview = self._overview(summary, insights)
+        self._column_stats = {}
+        # Column names as they may appear in a question
+        self._mention_patterns = [
+            (col, re.compile(r"(?<!\w)" + re.escape(str(col)) + r"(?!\w)", re.IGNORECASE))
+            for col in df.columns
+        ]
+
+    def _overview(self, summary, insights):
+        df = self.df
+        context = []
+
+        # Dataset overview
+        context.append(f"Dataset Overview:")
+        context.append(f"- Total rows: {len(df)}")
+        context.append(f"- Total columns: {len(df.columns)}")
+        context.append(f"- Column names: {', '.join(map(str, df.columns))}")
+
+        # Column types
+        context.append(f"\nColumn Types:")
+        context.append(f"- Numeric columns: {', '.join(self.columns.get('numeric', []))}")
+        context.append(f"- Categorical columns: {', '.join(self.columns.get('categorical', []))}")
+        context.append(f"- Datetime columns: {', '.join(self.columns.get('datetime', []))}")
+
+        # Summary statistics
+        if summary:
+            context.append(f"\nSummary Statistics:")
+            for key, value in summary.items():
+                if key != 'total_rows':
+                    context.append(f"- {key}: {value}")
+
+        # Key insights
+        if insights:
+            context.append(f"\nKey Insights from the data:")
+            for insight in insights[:10]:  # Limit to 10 insights
+                context.append(f"- {insight}")
+
+        # Sample data (first 5 rows)
+        context.append(f"\nSample Data (first 5 rows):")
+        sample_df = df.head(5).fillna('N/A')
+        for position, row in enumerate(sample_df.to_dict(orient="records"), start=1):
+            row_str = ", ".join([f"{col}: {val}" for col, val in row.items()])
+            context.append(f"  Row {position}: {row_str}")
+
+        return "\n".join(context)
+
+    def column_stats(self, col):
+        """Statistics lines of a numeric or categorical column, computed once."""
+        if col not in self._column_stats:
+            lines = []
+            if col in self.numeric:
+                col_data = self.df[col].dropna()
+                lines.append(f"  {col}:")
+                lines.append(f"    - Mean: {col_data.mean():.2f}")
+                lines.append(f"    - Median: {col_data.median():.2f}")
+                lines.append(f"    - Min: {col_data.min():.2f}")
+                lines.append(f"    - Max: {col_data.max():.2f}")
+                lines.append(f"    - Std Dev: {col_data.std():.2f}")
+            elif col in self.categorical:
+                value_counts = self.df[col].value_counts().head(5)
+                lines.append(f"  {col} (top 5):")
                 for val, count in value_counts.items():
-                    context.append(f"    - {val}: {count}")
-    
-    return "\n".join(context)
+                    lines.append(f"    - {val}: {count}")
+            self._column_stats[col] = "\n".join(lines)
+        return self._column_stats[col]
 
+    def mentioned_columns(self, message):
+        """Columns the message refers to by name."""
+        if not message:
+            return []
+        return [col for col, pattern in self._mention_patterns if pattern.search(message)]
 
-def process_chat_message(message, df, columns, summary, insights, chat_history=None):
-    """
-    Process a chat message and return an AI-generated response.
-    
-    Args:
-        message: User's question/message
-        df: The pandas DataFrame
-        columns: Dict with column types
-        summary: Summary statistics
-        insights: Generated insights
-        chat_history: Previous chat messages for context
-    
-    Returns:
-        AI-generated response string
-    """
-    try:
-        client = get_groq_client()
-        
-        # Generate data context
-        data_context = generate_data_context(df, columns, summary, insights)
-        
-        # Build system message
-        system_message = f"""You are a helpful data analysis assistant. You have access to a dataset that the user has uploaded. Your role is to:
+    def render(self, message=None, max_tokens=CHAT_CONTEXT_MAX_TOKENS):
+        """
+        The context for a prompt: the overview, then column statistics for the
+        columns the message mentions and the leading numeric and categorical
+        columns, as many as fit in max_tokens.
+        """
+        mentioned = self.mentioned_columns(message)
+        defaults = self.numeric[:DEFAULT_NUMERIC_COLUMNS] + self.categorical[:DEFAULT_CATEGORICAL_COLUMNS]
+        budget = max_tokens * CHARS_PER_TOKEN - len(self.overview)
+        included = set()
+        for col in dict.fromkeys(mentioned + defaults):
+            stats = self.column_stats(col)
+            if not stats:
+                continue
+            if len(stats) > budget:
+                break
+            budget -= len(stats) + 1
+            included.add(col)
+
+        context = [self.overview]
+        numeric = [col for col in self.numeric if col in included]
+        if numeric:
+            context.append(f"\nNumeric Column Statistics:")
+            context.extend(self.column_stats(col) for col in numeric)
+        categorical = [col for col in self.categorical if col in included]
+        if categorical:
+            context.append(f"\nCategorical Column Value Counts:")
+            context.extend(self.column_stats(col) for col in categorical)
+        return "\n".join(context)
+
+
+SYSTEM_PROMPT = """You are a helpful data analysis assistant. You have access to a dataset that the user has uploaded. Your role is to:
 1. Answer questions about the data accurately and concisely
 2. Provide insights and explanations about patterns in the data
 3. Suggest visualizations or analyses that might be useful
@@ -127,40 +157,50 @@ Guidelines:
 - If asked to perform calculations, use the actual data values provided
 """
 
-        # Build messages array
-        messages = [{"role": "system", "content": system_message}]
-        
-        # Add chat history if available
-        if chat_history:
-            for chat in chat_history[-10:]:  # Keep last 10 messages for context
-                messages.append({
-                    "role": chat.get("role", "user"),
-                    "content": chat.get("content", "")
-                })
-        
-        # Add current message
-        messages.append({"role": "user", "content": message})
-        
-        # Call Groq API
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",  # Using Llama 3.3 70B model
-            messages=messages,
-            temperature=0.7,
-            max_tokens=1024,
-            top_p=1,
-            stream=False
-        )
-        
-        return response.choices[0].message.content
-        
-    except Exception as e:
-        error_msg = str(e)
-        if "GROQ_API_KEY" in error_msg:
-            return "Error: Groq API key is not configured. Please set the GROQ_API_KEY environment variable."
-        elif "rate limit" in error_msg.lower():
-            return "Error: Rate limit exceeded. Please wait a moment and try again."
-        else:
-            return f"Error processing your request: {error_msg}"
+
+def build_chat_messages(message, data_context, chat_history=None):
+    """The messages array for a chat completion."""
+    messages = [{"role": "system", "content": SYSTEM_PROMPT.format(data_context=data_context)}]
+
+    # Add chat history if available
+    if chat_history:
+        for chat in chat_history[-10:]:  # Keep last 10 messages for context
+            messages.append({
+                "role": chat.get("role", "user"),
+                "content": chat.get("content", "")
+            })
+
+    # Add current message
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def chat_error_message(exc):
+    """The message shown to the user when a chat request fails."""
+    error_msg = str(exc)
+    if "GROQ_API_KEY" in error_msg:
+        return "Error: Groq API key is not configured. Please set the GROQ_API_KEY environment variable."
+    elif "rate limit" in error_msg.lower():
+        return "Error: Rate limit exceeded. Please wait a moment and try again."
+    else:
+        return f"Error processing your request: {error_msg}"
+
+
+async def stream_chat_message(message, context, chat_history=None):
+    """
+    Yield the AI response to a chat message as its text is generated.
+    context is the dataset's DataContext. Errors are raised to the caller;
+    chat_error_message turns them into the text to show.
+    """
+    # Column statistics may need computing; keep pandas off the event loop
+    data_context = await asyncio.to_thread(context.render, message)
+    async for text in llm.stream(
+        build_chat_messages(message, data_context, chat_history),
+        temperature=0.7,
+        max_tokens=1024,
+        top_p=1,
+    ):
+        yield text
 
 
 def generate_smart_suggestions(df, columns, insights):
@@ -204,34 +244,129 @@ def generate_smart_suggestions(df, columns, insights):
     return suggestions[:8]  # Return max 8 suggestions
 
 
+# How each aggregate reads in an answer ("The average price ...")
+AGGREGATE_LABELS = {
+    "mean": "average",
+    "sum": "total",
+    "median": "median",
+    "min": "minimum",
+    "max": "maximum",
+    "std": "standard deviation of",
+}
+
+
+def _format_number(value):
+    if isinstance(value, (int, np.integer)) or (isinstance(value, float) and value.is_integer() and abs(value) < 1e15):
+        return f"{int(value):,}"
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def _where(kwargs):
+    condition = kwargs.get('condition')
+    return f" for rows with {condition}" if condition else ""
+
+
 def answer_specific_query(query_type, df, columns, **kwargs):
     """
     Handle specific pre-defined query types for faster responses.
+    df may already be filtered; kwargs["condition"] then describes the filter.
     """
     numeric_cols = columns.get('numeric', [])
     categorical_cols = columns.get('categorical', [])
     
     if query_type == "describe":
         # Return descriptive statistics
-        desc = df.describe().to_dict()
+        cols = kwargs.get('cols')
+        desc = (df[cols] if cols else df).describe().to_dict()
         return f"Here are the descriptive statistics:\n{json.dumps(desc, indent=2)}"
     
     elif query_type == "correlation" and len(numeric_cols) >= 2:
         col1 = kwargs.get('col1', numeric_cols[0])
         col2 = kwargs.get('col2', numeric_cols[1])
         corr = df[col1].corr(df[col2])
+        if pd.isna(corr):
+            return f"The correlation between {col1} and {col2} cannot be computed from their values."
         strength = "strong" if abs(corr) > 0.7 else "moderate" if abs(corr) > 0.4 else "weak"
         direction = "positive" if corr > 0 else "negative"
         return f"The correlation between {col1} and {col2} is {corr:.3f}, indicating a {strength} {direction} relationship."
     
+    elif query_type == "top_correlations" and len(numeric_cols) >= 2:
+        # Strongest pairs, or the strongest partners of one column
+        n = kwargs.get('n', 5)
+        corr = df[numeric_cols].corr()
+        col = kwargs.get('col')
+        if col:
+            pairs = corr[col].drop(col).dropna()
+            pairs.index = [(col, other) for other in pairs.index]
+            result = f"Strongest correlations with {col}:\n"
+        else:
+            upper = corr.where(np.triu(np.ones(corr.shape, dtype=bool), k=1))
+            pairs = upper.stack()
+            result = "Strongest correlations between numeric columns:\n"
+        if pairs.empty:
+            return "There are not enough numeric values to compute correlations."
+        for (col1, col2), value in pairs.reindex(pairs.abs().sort_values(ascending=False).index).head(n).items():
+            result += f"  - {col1} and {col2}: {value:.3f}\n"
+        return result
+    
     elif query_type == "top_values" and categorical_cols:
         col = kwargs.get('col', categorical_cols[0])
-        top_vals = df[col].value_counts().head(5)
-        result = f"Top 5 values in {col}:\n"
+        n = kwargs.get('n', 5)
+        top_vals = df[col].value_counts().head(n)
+        result = f"Top {n} values in {col}{_where(kwargs)}:\n"
         for val, count in top_vals.items():
-            result += f"  - {val}: {count}\n"
+            result += f"  - {val}: {count:,}\n"
+        return result
+    
+    elif query_type == "row_count":
+        if kwargs.get('condition'):
+            return f"{len(df):,} of {kwargs.get('total_rows', len(df)):,} rows have {kwargs['condition']}."
+        return f"The dataset has {len(df):,} rows and {len(df.columns)} columns."
+    
+    elif query_type == "unique":
+        col = kwargs['col']
+        return f"{col} has {df[col].nunique():,} distinct values{_where(kwargs)}."
+    
+    elif query_type == "aggregate":
+        agg = kwargs.get('agg', 'mean')
+        lines = []
+        for col in kwargs['cols']:
+            values = df[col].dropna()
+            if values.empty:
+                lines.append(f"There are no {col} values{_where(kwargs)}.")
+                continue
+            value = getattr(values, agg)()
+            lines.append(
+                f"The {AGGREGATE_LABELS[agg]} {col}{_where(kwargs)} is {_format_number(value)} "
+                f"(over {len(values):,} rows)."
+            )
+        return "\n".join(lines)
+    
+    elif query_type == "group_by":
+        # Aggregate of a numeric column per group, or row counts per group
+        by = kwargs['by']
+        col = kwargs.get('col')
+        agg = kwargs.get('agg', 'mean')
+        n = kwargs.get('n', 20)
+        if col:
+            grouped = df.groupby(by, observed=True)[col].agg(agg)
+            title = f"{AGGREGATE_LABELS[agg].capitalize()} {col} by {by}"
+        else:
+            grouped = df.groupby(by, observed=True).size()
+            title = f"Number of rows by {by}"
+        grouped = grouped.dropna().sort_values(ascending=kwargs.get('ascending', False))
+        if grouped.empty:
+            return f"There are no {by} groups{_where(kwargs)}."
+        result = f"{title}{_where(kwargs)}:\n"
+        for key, value in grouped.head(n).items():
+            result += f"  - {key}: {_format_number(value)}\n"
+        if len(grouped) > n:
+            result += f"  ... and {len(grouped) - n:,} more\n"
         return result
     
+    
     elif query_type == "missing":
         missing = df.isnull().sum()
         missing = missing[missing > 0]
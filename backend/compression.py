@@ -0,0 +1,97 @@
+"""
+Response compression middleware.
+Compresses complete (non-streaming) responses with brotli when the client
+accepts it and the brotli package is installed, otherwise with gzip.
+Streaming responses (chunked bodies) are passed through unchanged.
+"""
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Content types that are already compressed or not worth compressing
+INCOMPRESSIBLE_PREFIXES = ("image/", "audio/", "video/", "application/zip", "application/gzip")
+
+
+def _choose_encoding(accept_encoding):
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = _choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                # Hold the headers until the first body chunk shows whether to compress
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            pending_start, start_message = start_message, None
+            response_headers = [
+                (name, value) for name, value in pending_start.get("headers", [])
+            ]
+            header_map = {name.lower(): value for name, value in response_headers}
+            body = message.get("body", b"")
+            content_type = header_map.get(b"content-type", b"").decode("latin-1")
+
+            compressible = (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and b"content-encoding" not in header_map
+                and not content_type.startswith(INCOMPRESSIBLE_PREFIXES)
+            )
+            if compressible:
+                body = _compress(body, encoding)
+                response_headers = [
+                    (name, value) for name, value in response_headers
+                    if name.lower() != b"content-length"
+                ]
+                response_headers.append((b"content-encoding", encoding.encode("latin-1")))
+                response_headers.append((b"content-length", str(len(body)).encode("latin-1")))
+                response_headers.append((b"vary", b"Accept-Encoding"))
+                message = {**message, "body": body}
+
+            await send({**pending_start, "headers": response_headers})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -1,8 +1,5 @@
 import pandas as pd
 import numpy as np
-from sklearn.impute import SimpleImputer, KNNImputer
-from sklearn.preprocessing import LabelEncoder
-from scipy import stats
 import re
 from datetime import datetime
 
@@ -255,6 +252,9 @@ def apply_imputation(df, metadata, use_knn=False):
     Apply intelligent imputation based on missing percentage and column type.
     Optionally use KNN imputation for numeric columns.
     """
+    # scikit-learn is slow to import, so it is loaded on first use
+    from sklearn.impute import SimpleImputer, KNNImputer
+
     df_clean = df.copy()
     imputation_report = {}
     excluded_columns = []
@@ -356,6 +356,8 @@ def detect_outliers_report(df, metadata):
     Just allow the report to show them.
     (Anomaly detector module can handle more complex logic, this is for the cleaning report)
     """
+    from scipy import stats
+
     outlier_report = {}
     numeric_df = df.select_dtypes(include=[np.number])
     
@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import hashlib
 
 def clean_data(df):
     """
@@ -91,3 +92,13 @@ def get_summary(df):
         summary[f"{col}_min"] = round(float(df[col].min()), 4)
         
     return summary
+
+def dataset_fingerprint(df):
+    """
+    Content hash of a dataframe (column names, index and values).
+    Identifies an analysis for cache keys and HTTP validators.
+    """
+    hasher = hashlib.sha256()
+    hasher.update("\x1f".join(str(col) for col in df.columns).encode("utf-8"))
+    hasher.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return hasher.hexdigest()[:32]
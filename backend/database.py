@@ -1,32 +1,144 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, create_engine
+from sqlalchemy import Column, Integer, String, JSON, DateTime, LargeBinary, ForeignKey, Index, UniqueConstraint, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.exc import OperationalError
 from datetime import datetime
 import os
 
-DATABASE_URL = "sqlite:///./data_viz.db"
+import orjson
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from serialization import dumps_str
+
+DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite+aiosqlite:///./data_viz.db")
+
+# Connection pool: WAL lets readers run alongside the single writer
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+# How long a connection waits for SQLite's write lock before failing
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+engine = create_async_engine(
+    DATABASE_URL,
+    json_serializer=dumps_str,
+    json_deserializer=orjson.loads,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Durable at checkpoints, and no fsync per commit, which is safe with WAL
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    # Deleting an analysis deletes its sections
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
 
 Base = declarative_base()
 
 class AnalysisResult(Base):
     __tablename__ = "analysis_results"
+    __table_args__ = (
+        # History listing: one session's analyses, newest first
+        Index("ix_analysis_results_session_date", "session_id", "upload_date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    filename = Column(String)
+    filename = Column(String, index=True)
     upload_date = Column(DateTime, default=datetime.utcnow)
+    # Listing metadata, kept out of result_data so listings never parse it
+    session_id = Column(String, nullable=True)
+    row_count = Column(Integer, nullable=True)
+    column_count = Column(Integer, nullable=True)
+    file_size = Column(Integer, nullable=True)
     result_data = Column(JSON)
     # Store a preview of the data (first few rows)
     data_preview = Column(JSON)
+    # File name of the Parquet copy of the full cleaned dataset (see dataset_store)
+    dataset_file = Column(String, nullable=True)
+    # "split" when result_data is a metadata record and the rest of the result
+    # lives in analysis_sections (see result_storage); NULL for inline results
+    storage_format = Column(String, nullable=True)
+
+class AnalysisSection(Base):
+    """A compressed part of a saved result (charts, details, preview, images)."""
+    __tablename__ = "analysis_sections"
+    __table_args__ = (
+        UniqueConstraint("analysis_id", "name", name="uq_analysis_sections_analysis_name"),
+    )
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, ForeignKey("analysis_results.id", ondelete="CASCADE"), nullable=False)
+    name = Column(String, nullable=False)
+    codec = Column(String, nullable=False)
+    # Size of the section's JSON before compression
+    raw_size = Column(Integer)
+    data = Column(LargeBinary, nullable=False)
 
-def get_db():
-    db = SessionLocal()
+async def init_db():
     try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    except OperationalError:
+        # Another server worker created the tables at the same time
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    await migrate_db()
+
+def _missing_columns(conn):
+    inspector = inspect(conn)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                missing.append((table.name, column.name, column.type.compile(dialect=conn.dialect)))
+    return missing
+
+def _create_indexes(conn):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=conn, checkfirst=True)
+
+async def migrate_db():
+    """
+    Bring tables created by older versions up to date by adding the columns
+    they lack. Added columns are nullable, so existing rows are left as NULL.
+    """
+    async with engine.connect() as conn:
+        missing = await conn.run_sync(_missing_columns)
+    for table_name, column_name, column_type in missing:
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+        except OperationalError:
+            # Added by another server worker in the meantime
+            pass
+    async with engine.begin() as conn:
+        await conn.run_sync(_create_indexes)
+    await backfill_db()
+
+async def backfill_db():
+    """
+    Fill the listing columns of rows saved before they existed from their
+    result JSON. Runs inside SQLite, so rows are not loaded into Python.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "UPDATE analysis_results SET "
+            "session_id = json_extract(result_data, '$.session_id'), "
+            "row_count = json_extract(result_data, '$.dataset_summary.overview.total_rows'), "
+            "column_count = json_extract(result_data, '$.dataset_summary.overview.total_columns') "
+            "WHERE session_id IS NULL AND json_valid(result_data)"
+        ))
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
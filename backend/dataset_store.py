@@ -0,0 +1,45 @@
+"""
+Persisted copies of cleaned datasets.
+Each analysis's cleaned DataFrame is written as a zstd-compressed Parquet file
+named by its fingerprint and referenced from the database row, so history
+restores the complete dataset instead of the stored preview.
+"""
+
+import os
+
+import pandas as pd
+
+DATASET_DIR = os.environ.get(
+    "DATASET_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets")
+)
+PARQUET_COMPRESSION = "zstd"
+
+
+def dataset_path(name):
+    """Path of a stored dataset; rows reference files by name relative to DATASET_DIR."""
+    return os.path.join(DATASET_DIR, name)
+
+
+def save_dataset(df, fingerprint):
+    """
+    Write a cleaned DataFrame to the dataset directory and return the file
+    name to store on the row. Identical datasets share one file.
+    Raises ImportError without pyarrow.
+    """
+    os.makedirs(DATASET_DIR, exist_ok=True)
+    name = f"{fingerprint}.parquet"
+    path = dataset_path(name)
+    if os.path.exists(path):
+        # Marks the file as in use for the retention sweep
+        os.utime(path)
+        return name
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, engine="pyarrow", compression=PARQUET_COMPRESSION)
+    # Renamed into place so readers never see a partial file
+    os.replace(tmp_path, path)
+    return name
+
+
+def load_dataset(name):
+    """Read a persisted dataset, memory-mapping the file."""
+    return pd.read_parquet(dataset_path(name), engine="pyarrow", memory_map=True)
@@ -1,8 +1,7 @@
 import pandas as pd
 import io
-from PyPDF2 import PdfReader
-from docx import Document
-import openpyxl
+
+# Document libraries are imported on first use to keep server start-up fast
 
 def parse_csv(file_content):
     """Parse CSV file"""
@@ -14,6 +13,8 @@ def parse_excel(file_content):
 
 def parse_pdf(file_content):
     """Parse PDF file and extract text as structured data"""
+    from PyPDF2 import PdfReader
+
     pdf_reader = PdfReader(io.BytesIO(file_content))
     
     # Extract text from all pages
@@ -43,6 +44,8 @@ def parse_pdf(file_content):
 
 def parse_word(file_content):
     """Parse Word document and extract tables"""
+    from docx import Document
+
     doc = Document(io.BytesIO(file_content))
     
     # Extract tables from document
@@ -0,0 +1,34 @@
+"""
+HTTP validators for analysis responses.
+ETags are derived from the analysis fingerprint so revisits to an unchanged
+history item, chart or report are answered with 304 Not Modified.
+"""
+
+import hashlib
+
+from fastapi import Response
+
+# Cached copies must be revalidated, and are never shared between users
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the given identifying parts."""
+    digest = hashlib.sha256(":".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def is_not_modified(if_none_match, etag):
+    """True when the If-None-Match header value matches etag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def not_modified_response(etag):
+    return Response(status_code=304, headers=validator_headers(etag))
+
+
+def validator_headers(etag):
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
@@ -0,0 +1,243 @@
+"""
+LLM client shared by the whole service.
+One AsyncOpenAI client per process keeps one pool of keep-alive connections
+to the Groq API for chat, chart interpretations and conclusions. Calls are
+limited by a concurrency semaphore and a token bucket of requests per minute,
+retried with jittered exponential backoff on rate limits and transient
+errors, and measured (latency, tokens, retries) for /health.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.environ.get("LLM_MODEL", "llama-3.3-70b-versatile")  # Llama 3.3 70B on Groq
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_TIMEOUT_SECONDS = float(os.environ.get("LLM_TIMEOUT_SECONDS", "60"))
+LLM_RETRY_BASE_MS = 500
+# Longest wait honoured from a Retry-After header
+LLM_MAX_RETRY_AFTER_SECONDS = 30
+
+
+class TokenBucket:
+    """
+    Requests-per-minute limiter: up to `burst` calls at once, refilled at
+    rate_per_minute. A rate of 0 disables it.
+    """
+
+    def __init__(self, rate_per_minute, burst):
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token, or return the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        """Wait for a token; returns the seconds waited."""
+        if self.rate <= 0:
+            return 0
+        waited = 0
+        while True:
+            delay = self._take()
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+def _retry_after(exc):
+    """Seconds the server asked to wait before retrying, if it said."""
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(value), LLM_MAX_RETRY_AFTER_SECONDS) if value else None
+    except ValueError:
+        return None
+
+
+class LLMClient:
+    """Pooled, rate-limited chat completions with retries and metrics."""
+
+    def __init__(self, max_concurrency, requests_per_minute, max_retries, timeout):
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.bucket = TokenBucket(requests_per_minute, burst=max_concurrency)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.active = 0
+        self.throttled_seconds = 0.0
+        self.latency_seconds = 0.0
+        self.max_latency_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def configured(self):
+        return bool(os.environ.get("GROQ_API_KEY"))
+
+    def client(self):
+        """The shared AsyncOpenAI client, created on first use."""
+        with self._lock:
+            if self._client is None:
+                # Imported on first use to keep server start-up fast
+                import httpx
+                from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+                api_key = os.environ.get("GROQ_API_KEY")
+                if not api_key:
+                    raise ValueError("GROQ_API_KEY environment variable is not set")
+                self._client = AsyncOpenAI(
+                    api_key=api_key,
+                    base_url=LLM_BASE_URL,
+                    timeout=self.timeout,
+                    # Retries are done here, under the rate limiter
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(limits=httpx.Limits(
+                        max_connections=self.max_concurrency,
+                        max_keepalive_connections=self.max_concurrency,
+                    )),
+                )
+            return self._client
+
+    async def _slot(self):
+        await self._semaphore.acquire()
+        with self._lock:
+            self.active += 1
+
+    async def _throttle(self):
+        """Wait for the rate limiter; every request sent, retries included, takes a token."""
+        waited = await self.bucket.acquire()
+        with self._lock:
+            self.throttled_seconds += waited
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+        self._semaphore.release()
+
+    async def _create(self, **params):
+        """Create a completion, retrying rate limits and transient failures."""
+        import openai
+
+        client = self.client()
+        for attempt in range(self.max_retries + 1):
+            await self._throttle()
+            try:
+                return await client.chat.completions.create(**params)
+            except (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError) as exc:
+                if isinstance(exc, openai.RateLimitError):
+                    with self._lock:
+                        self.rate_limited += 1
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_after(exc)
+                if delay is None:
+                    delay = LLM_RETRY_BASE_MS * (2 ** attempt) / 1000 * random.uniform(0.5, 1.5)
+                with self._lock:
+                    self.retries += 1
+                logger.info("LLM call failed (%s), retrying in %.1fs", type(exc).__name__, delay)
+                await asyncio.sleep(delay)
+
+    def _record(self, start, usage, failed=False):
+        latency = time.perf_counter() - start
+        with self._lock:
+            self.calls += 1
+            self.failures += failed
+            self.latency_seconds += latency
+            self.max_latency_seconds = max(self.max_latency_seconds, latency)
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+
+    async def complete(self, messages, model=LLM_MODEL, **params):
+        """Return the response text of a chat completion."""
+        await self._slot()
+        start = time.perf_counter()
+        try:
+            response = await self._create(model=model, messages=messages, stream=False, **params)
+        except Exception:
+            self._record(start, None, failed=True)
+            raise
+        finally:
+            self._release()
+        self._record(start, response.usage)
+        return response.choices[0].message.content
+
+    async def stream(self, messages, model=LLM_MODEL, **params):
+        """Yield the response text of a chat completion as it is generated."""
+        await self._slot()
+        start = time.perf_counter()
+        usage = None
+        failed = False
+        try:
+            # The last chunk then carries the token usage
+            stream = await self._create(
+                model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params
+            )
+            try:
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None) or usage
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                # Stops generation when the caller goes away mid-answer
+                await stream.close()
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._record(start, usage, failed=failed)
+            self._release()
+
+    async def close(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            await client.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "configured": self.configured,
+                "model": LLM_MODEL,
+                "calls": self.calls,
+                "active": self.active,
+                "failures": self.failures,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "avg_latency_seconds": round(self.latency_seconds / self.calls, 3) if self.calls else None,
+                "max_latency_seconds": round(self.max_latency_seconds, 3),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "max_concurrency": self.max_concurrency,
+                "requests_per_minute": LLM_REQUESTS_PER_MINUTE,
+            }
+
+
+llm = LLMClient(LLM_MAX_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_MAX_RETRIES, LLM_TIMEOUT_SECONDS)
@@ -0,0 +1,91 @@
+"""
+Thread-safe least-recently-used cache shared by the in-memory caches
+(chart images, chat answers, chart interpretations). Entries are bounded by
+count, by total size, or both, and can expire after a time to live.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Mapping of keys to values that evicts the least recently used entries
+    once max_entries or max_bytes (measured with size_of) is exceeded.
+    A limit of None disables it; with ttl_seconds, entries expire.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl_seconds=None, size_of=len):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._size_of = size_of
+        self._entries = OrderedDict()  # key -> (value, size, expiry time or None)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._live_entry(key) is not None
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        return entry
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def get(self, key):
+        """The cached value, or None."""
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        if self.max_entries is not None and self.max_entries <= 0:
+            return
+        size = self._size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expiry = time.monotonic() + self.ttl_seconds if self.ttl_seconds is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expiry)
+            self._size += size
+            while (
+                (self.max_entries is not None and len(self._entries) > self.max_entries)
+                or (self.max_bytes is not None and self._size > self.max_bytes)
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            stats = {"entries": len(self._entries)}
+            if self.max_entries is not None:
+                stats["max_entries"] = self.max_entries
+            if self.max_bytes is not None:
+                stats["bytes"] = self._size
+                stats["max_bytes"] = self.max_bytes
+            if self.ttl_seconds is not None:
+                stats["ttl_seconds"] = self.ttl_seconds
+            stats.update(hits=self.hits, misses=self.misses, evictions=self.evictions)
+            if self.ttl_seconds is not None:
+                stats["expirations"] = self.expirations
+            return stats
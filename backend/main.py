@@ -1,38 +1,67 @@
 from fastapi import FastAPI, UploadFile, File, Response, Depends, Header, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from dotenv import load_dotenv
 import pandas as pd
 import numpy as np
 import os
+import hashlib
 import secrets
+import asyncio
+import threading
+import time
 import logging
 import uvicorn
+from datetime import datetime
 
 # Load environment variables from .env file
 load_dotenv()
 
 from file_parser import parse_file
 from data_cleaner import clean_data
-from data_processor import get_summary
-from chart_recommender import recommend_charts
+from data_processor import get_summary, dataset_fingerprint
+from chart_recommender import recommend_charts, build_chart_frame, chart_frame_to_records
 from insight_generator import generate_insights
-from summary_generator import generate_dataset_summary, generate_chart_interpretations, generate_conclusion
-from report_generator import generate_pdf_report, generate_seaborn_boxplot_base64
-from chatbot import process_chat_message, generate_smart_suggestions
-from database import init_db, SessionLocal, AnalysisResult, get_db
-from sqlalchemy.orm import Session
-
-# Initialize Database
-init_db()
-
-app = FastAPI()
+from summary_generator import (
+    generate_dataset_summary, cached_chart_interpretations, llm_chart_interpretations, generate_conclusion,
+    interpretation_cache, needs_chart_data,
+)
+from report_generator import generate_pdf_report, boxplot_spec, render_chart_png, warm_up as warm_up_plotting
+from chart_image_cache import chart_images, image_key
+import render_pool
+from report_store import report_store
+from session_store import sessions
+from dataset_store import load_dataset
+from result_storage import SECTION_NAMES, SPLIT_FORMAT, load_sections, merge_result, compact_legacy_results, update_sections
+from persistence import persistence
+from maintenance import MAINTENANCE_INTERVAL_HOURS, enable_incremental_vacuum, maintenance_loop, run_maintenance, storage_report
+from chatbot import DataContext, chat_error_message, stream_chat_message, generate_smart_suggestions
+from chat_cache import answer_key, chat_answers
+from llm_client import llm
+from query_engine import QueryEngine
+from compression import CompressionMiddleware
+from http_cache import make_etag, is_not_modified, not_modified_response, validator_headers
+from serialization import NumpyJSONResponse, ARROW_STREAM_MEDIA_TYPE, dumps, dumps_str, to_columnar, to_arrow_ipc
+from database import init_db, engine, AnalysisResult, get_db
+from sqlalchemy import and_, or_, select
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+app = FastAPI(default_response_class=NumpyJSONResponse)
 logger = logging.getLogger(__name__)
+# Background tasks filling in LLM chart interpretations after uploads
+interpretation_tasks = set()
 
 MAX_UPLOAD_SIZE_MB = int(os.environ.get("MAX_UPLOAD_SIZE_MB", "50"))
 MAX_UPLOAD_SIZE_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
 ALLOWED_EXTENSIONS = {"csv", "xls", "xlsx", "pdf", "doc", "docx"}
+# Prime heavy imports and the render workers in the background once the server is up
+WARMUP_ON_STARTUP = os.environ.get("WARMUP_ON_STARTUP", "").lower() in ("1", "true", "yes")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
 
 
 def _get_allowed_origins() -> List[str]:
@@ -52,28 +81,9 @@ def _get_allowed_origin_regex() -> Optional[str]:
     regex = os.environ.get("ALLOWED_ORIGIN_REGEX", "").strip()
     return regex or None
 
-def convert_numpy_types(obj):
-    """Recursively convert numpy types to native Python types for JSON serialization."""
-    if isinstance(obj, dict):
-        return {key: convert_numpy_types(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_numpy_types(item) for item in obj]
-    elif isinstance(obj, (np.integer,)):
-        return int(obj)
-    elif isinstance(obj, (np.floating,)):
-        return float(obj)
-    elif isinstance(obj, np.ndarray):
-        return obj.tolist()
-    elif isinstance(obj, (np.bool_,)):
-        return bool(obj)
-    elif isinstance(obj, pd.Timestamp):
-        return obj.isoformat()
-    elif pd.isna(obj):
-        return None
-    return obj
+# Chart fields that older analyses stored inline instead of serving lazily
+INLINE_CHART_FIELDS = ("data", "mode", "outliers", "bins", "total_points")
 
-# In-memory session cache: session_id -> analysis payload
-latest_analysis = {}
 
 # Pydantic models for chat
 class ChatMessage(BaseModel):
@@ -83,11 +93,17 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     history: Optional[List[ChatMessage]] = None
+    # False to always ask the LLM for a fresh answer
+    cache: bool = True
 
 class ChatResponse(BaseModel):
     response: str
+    source: Optional[str] = None
     suggestions: Optional[List[str]] = None
 
+# Compress large JSON payloads (gzip, or brotli when available)
+app.add_middleware(CompressionMiddleware)
+
 # CORS configuration for production and development
 app.add_middleware(
     CORSMiddleware,
@@ -96,6 +112,8 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Readable from the browser on cross-origin responses
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
@@ -109,7 +127,14 @@ def resolve_session_id(
     return resolved
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: UploadFile = File(...),
+    payload_format: str = Query(default="records", alias="format", pattern="^(records|columnar)$"),
+):
+    """
+    Analyze an uploaded file. format=columnar returns the data preview as a
+    columnar payload instead of row records.
+    """
     try:
         if not file.filename:
             raise ValueError("File must include a valid name")
@@ -126,7 +151,7 @@ async def upload_file(file: UploadFile = File(...)):
         df_original = parse_file(contents, file.filename)
         
         if df_original.empty:
-            return {"error": "The uploaded file contains no data"}
+            return NumpyJSONResponse({"error": "The uploaded file contains no data"})
         
         # STEP 1: COMPREHENSIVE DATA CLEANING PIPELINE
         # returns df_cleaned and a detailed report
@@ -167,18 +192,25 @@ async def upload_file(file: UploadFile = File(...)):
                 anomalies_insights.append(f"{count} outliers detected in {col}.")
         
         # STEP 5: Recommendations
-        # PASS DF NOW
-        charts = recommend_charts(columns, df)
+        # Only the chart specs go out with the upload; each chart's data is
+        # built on first request through /charts/{chart_id}/data
+        charts = recommend_charts(columns, df, include_data=False)
+        session_id = secrets.token_urlsafe(24)
+        fingerprint = dataset_fingerprint(df)
+        analysis = {
+            "df": df,
+            "fingerprint": fingerprint,
+            "columns": columns,
+            "chart_data": {}
+        }
         
-        # Post-process charts: Replace or augment Box Plots with Seaborn images
+        # Post-process charts: Replace Box Plots with Seaborn images, rendered in
+        # the background render pool and served from /charts/{chart_id}/image
         for chart in charts:
-            if chart.get("type") == "boxPlot":
-                col = chart.get("column")
-                if col:
-                    img_base64 = generate_seaborn_boxplot_base64(df, col)
-                    if img_base64:
-                        chart["type"] = "image"
-                        chart["imageData"] = img_base64
+            if chart.get("type") == "boxPlot" and chart.get("column"):
+                submit_boxplot_render(fingerprint, chart, df)
+                chart["type"] = "image"
+                chart["imageUrl"] = f"/charts/{chart['id']}/image"
         
         # STEP 6: Insights
         generated_insights = generate_insights(df, summary)
@@ -186,13 +218,29 @@ async def upload_file(file: UploadFile = File(...)):
         
         # STEP 7: Generator Wrappers (Conclusion etc)
         dataset_summary = generate_dataset_summary(df, columns)
-        chart_interpretations = await generate_chart_interpretations(charts, df, columns)
+        # Only charts whose rule-based text reads their data need it now; it is
+        # cached on the session. Charts whose data cannot be built are dropped,
+        # as recommend_charts does when it includes the data.
+        interpreted_charts = []
+        for chart in list(charts):
+            if needs_chart_data(chart, fingerprint):
+                try:
+                    chart_data = get_chart_data(analysis, chart)
+                except Exception as exc:
+                    logger.warning("Dropping chart %s, its data could not be built: %s", chart["id"], exc)
+                    charts.remove(chart)
+                    continue
+                chart = {**chart, **chart_data, "data": chart_frame_to_records(chart_data["data"])}
+            interpreted_charts.append(chart)
+        # Cached or rule-based text now; LLM text for the rest follows in the background
+        chart_interpretations, pending_interpretations = cached_chart_interpretations(
+            interpreted_charts, df, fingerprint
+        )
         conclusion = await generate_conclusion(df, columns, summary, all_insights)
-
-        session_id = secrets.token_urlsafe(24)
         
         result = {
             "session_id": session_id,
+            "fingerprint": fingerprint,
             "cleaning_report": cleaning_report,
             "metadata": metadata, # Contains skewness, cardinality, relationships, column_types
             "dataset_summary": dataset_summary,
@@ -205,31 +253,42 @@ async def upload_file(file: UploadFile = File(...)):
             "data": df.fillna("").head(50).to_dict(orient="records")
         }
 
-        # STEP 8: Save to Database for future reference
-        try:
-            db = SessionLocal()
-            db_analysis = AnalysisResult(
-                filename=file.filename,
-                result_data=convert_numpy_types(result),
-                data_preview=df.fillna("").head(20).to_dict(orient="records")
-            )
-            db.add(db_analysis)
-            db.commit()
-            db.refresh(db_analysis)
-            result["id"] = db_analysis.id
-            db.close()
-        except Exception as db_err:
-            logger.warning("Database save failed: %s", db_err)
+        # STEP 8: Save to Database for future reference, with the full
+        # cleaned dataset in a Parquet file for history restore. Written
+        # behind the response; the result gets its row id once committed.
+        saved = persistence.submit(
+            {
+                "filename": file.filename,
+                "session_id": session_id,
+                "row_count": len(df),
+                "column_count": len(df.columns),
+                "file_size": len(contents),
+            },
+            result,
+            df=df,
+            fingerprint=fingerprint,
+        )
+        saved.add_done_callback(lambda done: _record_saved_id(result, done))
         
-        # Cache for PDF generation (store DF and COLUMNS separately to avoid serialization issues in JSON if we needed to serialize)
-        # But here latest_analysis is in-memory dict, so storing DF is fine.
-        latest_analysis[session_id] = {
-            "result": result,
-            "df": df,
-            "columns": columns
-        }
+        # Cache for PDF generation and chat (store DF and COLUMNS separately to avoid serialization issues in JSON)
+        analysis["result"] = result
+        await asyncio.to_thread(sessions.put, session_id, analysis)
+        # Build the PDF report in the background so the download is ready
+        schedule_report(session_id, analysis)
+        if pending_interpretations:
+            task = asyncio.create_task(complete_chart_interpretations(
+                session_id, analysis, [interpreted_charts[idx] for idx in pending_interpretations],
+                pending_interpretations, saved,
+            ))
+            # The event loop only keeps weak references to tasks
+            interpretation_tasks.add(task)
+            task.add_done_callback(interpretation_tasks.discard)
+            analysis["interpretations_task"] = task
         
-        return convert_numpy_types(result)
+        response = {**result, "interpretations_pending": bool(pending_interpretations)}
+        if payload_format == "columnar":
+            return NumpyJSONResponse({**response, "data": to_columnar(df.head(50))})
+        return NumpyJSONResponse(response)
     
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve)) from ve
@@ -240,98 +299,503 @@ async def upload_file(file: UploadFile = File(...)):
             detail="An internal error occurred while processing the file",
         ) from exc
 
+def _parse_history_cursor(cursor):
+    """Split a history cursor ("<upload date ISO>_<id>") into its parts."""
+    try:
+        date_part, id_part = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(date_part), int(id_part)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail="Invalid history cursor") from exc
+
+
 @app.get("/history")
-async def get_history(session_id: str = Depends(resolve_session_id), db: Session = Depends(get_db)):
-    """List previous analyses."""
-    history = db.query(AnalysisResult).order_by(AnalysisResult.upload_date.desc()).all()
-    response = []
-    for item in history:
-        result_data = item.result_data or {}
-        if isinstance(result_data, dict) and result_data.get("session_id") == session_id:
-            response.append({
-                "id": item.id,
-                "filename": item.filename,
-                "date": item.upload_date.isoformat(),
-            })
-    return response
+async def get_history(
+    response: Response,
+    session_id: str = Depends(resolve_session_id),
+    limit: int = Query(default=HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    List previous analyses, newest first, one page at a time. When more
+    remain, the X-Next-Cursor header holds the cursor for the next page.
+    """
+    # Listing columns only; result blobs are never read here
+    query = select(
+        AnalysisResult.id,
+        AnalysisResult.filename,
+        AnalysisResult.upload_date,
+        AnalysisResult.row_count,
+        AnalysisResult.column_count,
+        AnalysisResult.file_size,
+    ).where(AnalysisResult.session_id == session_id)
+    if cursor:
+        before_date, before_id = _parse_history_cursor(cursor)
+        query = query.where(or_(
+            AnalysisResult.upload_date < before_date,
+            and_(AnalysisResult.upload_date == before_date, AnalysisResult.id < before_id),
+        ))
+    query = query.order_by(AnalysisResult.upload_date.desc(), AnalysisResult.id.desc()).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+
+    page = rows[:limit]
+    if len(rows) > limit:
+        last = page[-1]
+        response.headers["X-Next-Cursor"] = f"{last.upload_date.isoformat()}_{last.id}"
+    return [
+        {
+            "id": row.id,
+            "filename": row.filename,
+            "date": row.upload_date.isoformat(),
+            "rows": row.row_count,
+            "columns": row.column_count,
+            "size": row.file_size,
+        }
+        for row in page
+    ]
 
 @app.get("/history/{item_id}")
-async def get_history_item(item_id: int, session_id: str = Depends(resolve_session_id), db: Session = Depends(get_db)):
-    """Retrieve a specific analysis."""
-    item = db.query(AnalysisResult).filter(AnalysisResult.id == item_id).first()
+async def get_history_item(
+    item_id: int,
+    session_id: str = Depends(resolve_session_id),
+    sections: Optional[str] = Query(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Retrieve a specific analysis. The response holds the analysis metadata
+    plus the sections named in ?sections= (comma-separated, or "all"); the
+    "sections" field lists those available. Analyses saved before split
+    storage are returned whole. Answers 304 when the client's copy is current.
+    """
+    if sections == "all":
+        requested = list(SECTION_NAMES)
+    else:
+        requested = [name for name in (sections or "").split(",") if name]
+        unknown = set(requested) - set(SECTION_NAMES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown sections: {', '.join(sorted(unknown))}")
+
+    item = (await db.execute(
+        select(AnalysisResult).where(AnalysisResult.id == item_id, AnalysisResult.session_id == session_id)
+    )).scalar_one_or_none()
     if not item:
         raise HTTPException(status_code=404, detail="Analysis not found")
 
     result_data = item.result_data or {}
-    if not isinstance(result_data, dict) or result_data.get("session_id") != session_id:
+    if not isinstance(result_data, dict):
         raise HTTPException(status_code=404, detail="Analysis not found")
-    
-    # Update session cache for chat/download
-    latest_analysis[session_id] = {
+    result_data = {**result_data, "id": item.id}
+
+    # Update session cache for chat/download. The session's current analysis,
+    # in memory or spilled to disk, keeps its full DataFrame.
+    current = await asyncio.to_thread(sessions.get, session_id)
+    restore = current is None or current["result"].get("id") != item.id
+    if item.storage_format != SPLIT_FORMAT:
+        full_result = response_data = result_data
+    else:
+        loaded = await load_sections(db, item.id, list(SECTION_NAMES) if restore else requested)
+        full_result = merge_result(result_data, loaded)
+        response_data = merge_result(result_data, {name: loaded[name] for name in requested if name in loaded})
+    if restore:
+        await asyncio.to_thread(sessions.put, session_id, await restore_analysis(item, full_result))
+
+    # Interpretations are rewritten after the upload once the LLM text arrives
+    etag = make_etag(
+        "history", item.id, result_data.get("fingerprint") or item.upload_date.isoformat(), ",".join(requested),
+        dumps_str(response_data.get("chart_interpretations")),
+    )
+    if is_not_modified(if_none_match, etag):
+        return not_modified_response(etag)
+    return NumpyJSONResponse(response_data, headers=validator_headers(etag))
+
+
+async def complete_chart_interpretations(session_id, analysis, charts, indexes, saved):
+    """
+    Replace the fallback interpretations of an upload's charts (at indexes)
+    with LLM text once it arrives, in the session and in the saved analysis.
+    """
+    try:
+        # The prompts describe each chart's data, built off the event loop
+        charts = await asyncio.to_thread(lambda: [_chart_with_data(analysis, chart) for chart in charts])
+        texts = await llm_chart_interpretations(charts, analysis["df"], analysis["fingerprint"])
+    except Exception:
+        logger.exception("Chart interpretation failed")
+        return
+    result = analysis["result"]
+    interpretations = list(result["chart_interpretations"])
+    for idx, text in zip(indexes, texts):
+        if text:
+            interpretations[idx] = {**interpretations[idx], "interpretation": text}
+    result["chart_interpretations"] = interpretations
+    if sessions.shared:
+        # Written through so other workers see the new text
+        await asyncio.to_thread(sessions.put, session_id, analysis)
+    try:
+        await update_sections(await saved, result, ["charts"])
+    except Exception as exc:
+        logger.warning("Could not save chart interpretations: %s", exc)
+
+
+def _chart_with_data(analysis, chart):
+    """The chart with its data as row records; unchanged when the data cannot be built."""
+    if "data" in chart:
+        return chart
+    try:
+        chart_data = get_chart_data(analysis, chart)
+    except Exception as exc:
+        logger.warning("Could not build data for chart %s: %s", chart.get("id"), exc)
+        return chart
+    return {**chart, **chart_data, "data": chart_frame_to_records(chart_data["data"])}
+
+
+def _record_saved_id(result, saved):
+    if not saved.cancelled() and saved.exception() is None:
+        result["id"] = saved.result()
+
+
+async def restore_analysis(item, result_data):
+    """
+    Rebuild a session analysis from a history row, from its persisted dataset
+    when there is one. Older rows only have the data preview.
+    """
+    analysis = {
         "result": result_data,
-        "df": pd.DataFrame(item.data_preview), # Limited context for chat
-        "columns": result_data.get("columns", {})
+        "columns": result_data.get("columns", {}),
+        "chart_data": {}
     }
-    
-    return result_data
+    if item.dataset_file:
+        try:
+            analysis["df"] = await asyncio.to_thread(load_dataset, item.dataset_file)
+            analysis["fingerprint"] = result_data.get("fingerprint")
+            return analysis
+        except Exception as exc:
+            logger.warning("Could not load stored dataset, using the preview: %s", exc)
+    analysis["df"] = pd.DataFrame(item.data_preview or result_data.get("data") or []) # Limited context for chat
+    return analysis
+
+
+def _dataset_object(analysis, key, build):
+    """
+    An object derived from the session's dataset, built on first use and kept
+    with the analysis until its data changes.
+    """
+    fingerprint = analysis_fingerprint(analysis)
+    cached = analysis.get(key)
+    if cached is None or cached.fingerprint != fingerprint:
+        cached = build(fingerprint)
+        analysis[key] = cached
+    return cached
+
+
+def get_chat_context(analysis):
+    """The chat data context of the session's dataset."""
+    result = analysis.get("result", {})
+    return _dataset_object(analysis, "chat_context", lambda fingerprint: DataContext(
+        analysis["df"],
+        analysis.get("columns"),
+        result.get("summary", {}),
+        result.get("insights", []),
+        fingerprint=fingerprint,
+    ))
+
+
+def answer_from_data(analysis, message):
+    """
+    The exact answer to a computational question, computed from the session's
+    dataset, or None when the question needs the LLM.
+    """
+    query_engine = _dataset_object(analysis, "query_engine", lambda fingerprint: QueryEngine(
+        analysis["df"], analysis.get("columns"), fingerprint=fingerprint
+    ))
+    try:
+        return query_engine.answer(message)
+    except Exception as exc:
+        logger.warning("Local query answer failed, asking the LLM: %s", exc)
+        return None
+
+
+def get_chart_data(analysis, chart):
+    """
+    Return the data fields of a chart ("data" as a DataFrame), building them on
+    first use and caching them on the session. Charts saved before lazy chart
+    data carry it inline.
+    """
+    chart_data = analysis.setdefault("chart_data", {})
+    chart_id = chart.get("id")
+    if chart_id not in chart_data:
+        if "data" in chart:
+            inline = {key: value for key, value in chart.items() if key in INLINE_CHART_FIELDS}
+            inline["data"] = pd.DataFrame.from_records(chart["data"])
+            chart_data[chart_id] = inline
+        else:
+            chart_data[chart_id] = build_chart_frame(chart, analysis["df"])
+    return chart_data[chart_id]
+
+
+def _reduce_points(frame, max_points):
+    """Evenly stride rows down to max_points, keeping the first and last row."""
+    if len(frame) <= max_points:
+        return frame
+    indices = np.unique(np.linspace(0, len(frame) - 1, max_points).round().astype(int))
+    return frame.iloc[indices]
+
+
+@app.get("/charts/interpretations")
+async def get_chart_interpretations(
+    session_id: str = Depends(resolve_session_id),
+    wait: float = Query(default=0, ge=0, le=60),
+):
+    """
+    The session's chart interpretations. LLM text replaces the rule-based
+    text after the upload; with wait, the request waits up to that many
+    seconds for it.
+    """
+    analysis = await asyncio.to_thread(sessions.get, session_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="No data available for this session")
+    task = analysis.get("interpretations_task")
+    if task is not None and not task.done() and wait:
+        # asyncio.wait leaves the task running when the wait times out
+        await asyncio.wait({task}, timeout=wait)
+    return {
+        "chart_interpretations": analysis["result"].get("chart_interpretations", []),
+        "pending": task is not None and not task.done(),
+    }
+
+
+@app.get("/charts/{chart_id}/data")
+async def get_chart(
+    chart_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1),
+    max_points: Optional[int] = Query(default=None, ge=2),
+    payload_format: str = Query(default="records", alias="format", pattern="^(records|columnar|arrow)$"),
+    session_id: str = Depends(resolve_session_id),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Serve the data of one recommended chart.
+    max_points reduces the series to an evenly strided level of detail;
+    offset/limit then page through the resulting rows.
+    format selects row records (default), a columnar payload with sorted x
+    values delta-encoded, or an Arrow IPC stream.
+    """
+    analysis = await asyncio.to_thread(sessions.get, session_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="No analysis available for this session")
+
+    chart = next(
+        (c for c in analysis["result"].get("recommended_charts", []) if c.get("id") == chart_id),
+        None,
+    )
+    if chart is None:
+        raise HTTPException(status_code=404, detail="Chart not found")
+
+    etag = make_etag(
+        "chart", session_id, analysis_fingerprint(analysis),
+        chart_id, offset, limit, max_points, payload_format,
+    )
+    if is_not_modified(if_none_match, etag):
+        return not_modified_response(etag)
+
+    try:
+        chart_data = get_chart_data(analysis, chart)
+    except Exception as exc:
+        logger.warning("Could not build data for chart %s: %s", chart_id, exc)
+        raise HTTPException(
+            status_code=422, detail="This chart's data cannot be built from the dataset"
+        ) from exc
+
+    frame = chart_data["data"]
+    if max_points:
+        frame = _reduce_points(frame, max_points)
+    total = len(frame)
+    end = offset + limit if limit else None
+    page = frame.iloc[offset:end]
+
+    payload = {key: value for key, value in chart_data.items() if key != "data"}
+    payload.update({"id": chart_id, "total": total, "offset": offset, "limit": limit})
+
+    if payload_format == "arrow":
+        try:
+            content = to_arrow_ipc(page, metadata=payload)
+        except ImportError as exc:
+            raise HTTPException(status_code=406, detail="Arrow output is not available on this server") from exc
+        return Response(content=content, media_type=ARROW_STREAM_MEDIA_TYPE, headers=validator_headers(etag))
+
+    if payload_format == "columnar":
+        payload["data"] = to_columnar(page, delta_columns=(chart.get("x"),))
+    else:
+        payload["data"] = chart_frame_to_records(page)
+    return NumpyJSONResponse(payload, headers=validator_headers(etag))
+
+
+def analysis_fingerprint(analysis):
+    """
+    Fingerprint of the session's DataFrame. Sessions restored from history
+    hold only the data preview, so theirs is computed on first use.
+    """
+    if not analysis.get("fingerprint"):
+        analysis["fingerprint"] = dataset_fingerprint(analysis["df"])
+    return analysis["fingerprint"]
+
+
+def report_content_hash(analysis):
+    """Hash of everything the PDF report is built from."""
+    # The row id arrives once the analysis is saved, and chart interpretations
+    # (filled in later) are not in the report; neither changes it
+    content = {
+        key: value for key, value in analysis["result"].items() if key not in ("id", "chart_interpretations")
+    }
+    return hashlib.sha256(
+        analysis_fingerprint(analysis).encode("utf-8") + dumps(content)
+    ).hexdigest()
+
+
+def schedule_report(session_id, analysis):
+    """
+    Return a future for the path of the session's PDF in the report store,
+    generating it in the background when the store has no current copy.
+    """
+    return report_store.submit(
+        session_id,
+        report_content_hash(analysis),
+        generate_pdf_report,
+        analysis["result"],
+        analysis["df"],
+        analysis["columns"],
+        "report.pdf",
+        analysis_fingerprint(analysis),
+    )
+
+
+def submit_boxplot_render(fingerprint, chart, df):
+    """
+    Schedule the Seaborn box plot image of a chart in the render pool.
+    The image is cached by dataset fingerprint and spec, so repeat requests
+    for the same dataset reuse it.
+    """
+    spec = boxplot_spec(chart["column"])
+    return render_pool.submit_render(
+        image_key(fingerprint, spec), render_chart_png, spec, df[spec["columns"]]
+    )
+
+
+@app.get("/charts/{chart_id}/image")
+async def get_chart_image(
+    chart_id: str,
+    session_id: str = Depends(resolve_session_id),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Serve the rendered image of an image chart. Images missing from the
+    chart image cache are re-rendered from the session data.
+    """
+    analysis = await asyncio.to_thread(sessions.get, session_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="No analysis available for this session")
+
+    chart = next(
+        (c for c in analysis["result"].get("recommended_charts", []) if c.get("id") == chart_id),
+        None,
+    )
+    if chart is None or chart.get("type") != "image" or not chart.get("column"):
+        raise HTTPException(status_code=404, detail="Chart image not found")
+
+    fingerprint = analysis_fingerprint(analysis)
+    etag = make_etag("image", session_id, fingerprint, chart_id)
+    if is_not_modified(if_none_match, etag):
+        return not_modified_response(etag)
+
+    try:
+        future = submit_boxplot_render(fingerprint, chart, analysis["df"])
+        png = await asyncio.wrap_future(future)
+    except Exception as exc:
+        logger.exception("Failed to render image for chart %s", chart_id)
+        raise HTTPException(status_code=500, detail="Failed to render chart image") from exc
+
+    return Response(content=png, media_type="image/png", headers=validator_headers(etag))
+
 
 @app.get("/download_report")
-async def download_report(session_id: str = Depends(resolve_session_id)):
-    analysis = latest_analysis.get(session_id)
+async def download_report(
+    session_id: str = Depends(resolve_session_id),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """
+    Stream the session's PDF report from the report store. Reports are
+    pre-generated after upload; on a miss the report is generated now.
+    """
+    analysis = await asyncio.to_thread(sessions.get, session_id)
     if not analysis:
         raise HTTPException(status_code=404, detail="No analysis available for this session")
+
+    etag = make_etag("report", session_id, report_content_hash(analysis))
+    if is_not_modified(if_none_match, etag):
+        return not_modified_response(etag)
     
     try:
-        # Retrieve cached data
-        result = analysis.get("result")
-        df = analysis.get("df")
-        columns = analysis.get("columns")
-        
-        pdf_content = generate_pdf_report(result, df, columns)
-        
-        return Response(
-            content=pdf_content,
-            media_type="application/pdf",
-            headers={"Content-Disposition": "attachment; filename=report.pdf"}
-        )
+        path = await asyncio.wrap_future(schedule_report(session_id, analysis))
     except Exception as exc:
         logger.exception("Failed to generate report")
         raise HTTPException(status_code=500, detail="Failed to generate report") from exc
 
+    if not os.path.exists(path):
+        # Evicted since it was stored; build it again
+        path = await asyncio.wrap_future(schedule_report(session_id, analysis))
+    return FileResponse(
+        path,
+        media_type="application/pdf",
+        filename="report.pdf",
+        headers=validator_headers(etag),
+    )
+
+
+def _chat_history(request):
+    """The request's chat history as role/content dicts."""
+    if not request.history:
+        return None
+    return [{"role": msg.role, "content": msg.content} for msg in request.history]
+
+
+def _chat_answer_key(analysis, request, history):
+    """Key of the request's answer in the chat cache; None bypasses the cache."""
+    if not request.cache:
+        return None
+    return answer_key(analysis_fingerprint(analysis), request.message, history)
+
 
 @app.post("/chat")
 async def chat(request: ChatRequest, session_id: str = Depends(resolve_session_id)):
     """
     Chat endpoint for interacting with the dataset using AI.
     """
-    analysis = latest_analysis.get(session_id)
+    analysis = await asyncio.to_thread(sessions.get, session_id)
     if not analysis:
         raise HTTPException(status_code=404, detail="No data available for this session")
     
     try:
-        df = analysis.get("df")
-        columns = analysis.get("columns")
-        result = analysis.get("result", {})
-        summary = result.get("summary", {})
-        insights = result.get("insights", [])
-        
-        # Convert chat history to proper format
-        history = None
-        if request.history:
-            history = [{"role": msg.role, "content": msg.content} for msg in request.history]
-        
-        # Process the message
-        response = process_chat_message(
-            message=request.message,
-            df=df,
-            columns=columns,
-            summary=summary,
-            insights=insights,
-            chat_history=history
-        )
+        # Computational questions are answered from the data, without the LLM
+        response = await asyncio.to_thread(answer_from_data, analysis, request.message)
+        source = "data"
+        if response is None:
+            history = _chat_history(request)
+            key = await asyncio.to_thread(_chat_answer_key, analysis, request, history)
+            response = chat_answers.get(key)
+            source = "cache"
+        if response is None:
+            source = "llm"
+            try:
+                context = await asyncio.to_thread(get_chat_context, analysis)
+                response = "".join([text async for text in stream_chat_message(request.message, context, history)])
+                chat_answers.put(key, response)
+            except Exception as exc:
+                response = chat_error_message(exc)
         
         return {
             "response": response,
+            "source": source,
             "suggestions": None  # Suggestions only on initial load
         }
         
@@ -340,12 +804,62 @@ async def chat(request: ChatRequest, session_id: str = Depends(resolve_session_i
         raise HTTPException(status_code=500, detail="Chat request failed") from exc
 
 
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest, session_id: str = Depends(resolve_session_id)):
+    """
+    Chat endpoint streaming the response as server-sent events: "delta"
+    events carry {"text": ...} as it is generated, then a final "done"
+    ({"source": "data", "cache" or "llm"}) or "error" ({"message": ...}) event.
+    """
+    analysis = await asyncio.to_thread(sessions.get, session_id)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="No data available for this session")
+    history = _chat_history(request)
+
+    async def events():
+        try:
+            answer = await asyncio.to_thread(answer_from_data, analysis, request.message)
+            if answer is not None:
+                yield _sse_event("delta", {"text": answer})
+                yield _sse_event("done", {"source": "data"})
+                return
+            key = await asyncio.to_thread(_chat_answer_key, analysis, request, history)
+            cached = chat_answers.get(key)
+            if cached is not None:
+                yield _sse_event("delta", {"text": cached})
+                yield _sse_event("done", {"source": "cache"})
+                return
+            context = await asyncio.to_thread(get_chat_context, analysis)
+            parts = []
+            async for text in stream_chat_message(request.message, context, history):
+                parts.append(text)
+                yield _sse_event("delta", {"text": text})
+            # Only answers streamed to the end are cached
+            chat_answers.put(key, "".join(parts))
+        except Exception as exc:
+            logger.warning("Chat stream failed: %s", exc)
+            yield _sse_event("error", {"message": chat_error_message(exc)})
+            return
+        yield _sse_event("done", {"source": "llm"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are sent
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/chat/suggestions")
 async def get_chat_suggestions(session_id: str = Depends(resolve_session_id)):
     """
     Get smart question suggestions based on the current dataset.
     """
-    analysis = latest_analysis.get(session_id)
+    analysis = await asyncio.to_thread(sessions.get, session_id)
     if not analysis:
         return {"suggestions": [
             "Upload a file to start analyzing your data",
@@ -371,12 +885,111 @@ async def get_chat_suggestions(session_id: str = Depends(resolve_session_id)):
         ]}
 
 
+def _warm_up():
+    """Load the libraries the first upload, report and chat would otherwise pay for."""
+    start = time.perf_counter()
+    try:
+        import sklearn.impute  # noqa: F401 - used by data_cleaner
+        import scipy.stats  # noqa: F401
+        import openai  # noqa: F401 - used by llm_client
+
+        warm_up_plotting()
+        render_pool.warm_up()
+    except Exception:
+        logger.exception("Warm-up failed")
+        return
+    logger.info("Warm-up finished in %.2fs", time.perf_counter() - start)
+
+
+async def _database_upkeep():
+    """Convert older rows to split storage and enable incremental vacuum, then run periodic maintenance."""
+    try:
+        converted = await compact_legacy_results()
+        if converted:
+            logger.info("Converted %d saved analyses to split storage", converted)
+    except Exception:
+        logger.exception("Converting saved analyses to split storage failed")
+    try:
+        await enable_incremental_vacuum()
+    except OperationalError as exc:
+        # Another server worker holds the database while converting it
+        logger.warning("Could not enable incremental vacuum: %s", exc)
+    except Exception:
+        logger.exception("Enabling incremental vacuum failed")
+    if MAINTENANCE_INTERVAL_HOURS > 0:
+        await maintenance_loop()
+
+
+@app.on_event("startup")
+async def startup():
+    # Initialize Database
+    await init_db()
+    persistence.start()
+    # Older rows and databases without incremental vacuum are converted in the background
+    app.state.upkeep = asyncio.create_task(_database_upkeep())
+    if WARMUP_ON_STARTUP:
+        # Runs off the event loop so the server is ready while imports load
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    app.state.upkeep.cancel()
+    # Lets the task close its database connection before the engine goes
+    try:
+        await app.state.upkeep
+    except asyncio.CancelledError:
+        pass
+    # Analyses still queued for saving are written before the engine closes
+    await persistence.stop()
+    await llm.close()
+    render_pool.shutdown()
+    report_store.shutdown()
+    await engine.dispose()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None, alias="X-Admin-Token")):
+    """Admin endpoints need the ADMIN_TOKEN; without one configured they are disabled."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@app.get("/admin/storage", dependencies=[Depends(require_admin)])
+async def admin_storage():
+    """Storage used by database tables, result sections and dataset files."""
+    return await storage_report()
+
+
+@app.post("/admin/maintenance", dependencies=[Depends(require_admin)])
+async def admin_maintenance():
+    """Apply the retention policy and compact the database now."""
+    return await run_maintenance()
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "active_sessions": len(latest_analysis)}
+    session_stats = await asyncio.to_thread(sessions.stats)
+    return {
+        "status": "healthy",
+        "active_sessions": session_stats["sessions"],
+        "session_store": session_stats,
+        "chart_image_cache": chart_images.stats(),
+        "report_store": report_store.stats(),
+        "persistence": persistence.stats(),
+        "chat_cache": chat_answers.stats(),
+        "llm": llm.stats(),
+        "interpretation_cache": interpretation_cache.stats(),
+    }
 
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers share sessions through SESSION_SPILL_DIR (see session_store)
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
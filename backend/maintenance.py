@@ -0,0 +1,264 @@
+"""
+Database maintenance: retention, compaction and storage accounting.
+Retention is opt-in: saved analyses older than RETENTION_DAYS are deleted,
+then the oldest until the database's live data and the dataset files rows
+reference together fit RETENTION_MAX_DB_MB; their sections go with them and
+dataset files no row references any more are removed. Freed pages are returned to the file system
+with incremental vacuum.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select, text
+
+from database import AnalysisResult, AnalysisSection, engine
+from dataset_store import DATASET_DIR, dataset_path
+from persistence import persistence
+
+logger = logging.getLogger(__name__)
+
+# 0 (the default) disables the respective limit
+RETENTION_DAYS = int(os.environ.get("RETENTION_DAYS", "0"))
+RETENTION_MAX_DB_MB = int(os.environ.get("RETENTION_MAX_DB_MB", "0"))
+MAINTENANCE_INTERVAL_HOURS = float(os.environ.get("MAINTENANCE_INTERVAL_HOURS", "24"))
+# Rows deleted per transaction when trimming to the size limit
+RETENTION_BATCH_SIZE = 100
+
+
+async def enable_incremental_vacuum():
+    """
+    Switch the database to incremental auto-vacuum. Databases created before
+    need one full VACUUM for the setting to take effect.
+    """
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+        if mode == 2:
+            return
+        await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+        await conn.execute(text("VACUUM"))
+        logger.info("Database converted to incremental auto-vacuum")
+
+
+async def _pragma(conn, name):
+    return (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+
+
+async def database_usage():
+    """Bytes used by the database file: total, free pages, and live data."""
+    async with engine.connect() as conn:
+        page_size = await _pragma(conn, "page_size")
+        page_count = await _pragma(conn, "page_count")
+        freelist_count = await _pragma(conn, "freelist_count")
+    return {
+        "file_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist_count,
+        "live_bytes": page_size * (page_count - freelist_count),
+    }
+
+
+async def _delete_analyses(conn, ids):
+    # Sections are deleted explicitly so this holds even without foreign keys
+    await conn.execute(delete(AnalysisSection).where(AnalysisSection.analysis_id.in_(ids)))
+    await conn.execute(delete(AnalysisResult).where(AnalysisResult.id.in_(ids)))
+
+
+async def _delete_orphaned_datasets(dataset_files, started):
+    """
+    Remove dataset files of deleted rows that no remaining row references.
+    Queued analyses are saved first so their rows count as references, and
+    files used since `started` (a later upload of the same data) are kept.
+    """
+    if not dataset_files:
+        return 0
+    await persistence.flush()
+    async with engine.connect() as conn:
+        referenced = set((await conn.execute(
+            select(AnalysisResult.dataset_file).where(AnalysisResult.dataset_file.in_(dataset_files))
+        )).scalars())
+    removed = 0
+    for name in set(dataset_files) - referenced:
+        path = dataset_path(name)
+        try:
+            if os.path.getmtime(path) >= started:
+                continue
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+async def _sweep_unreferenced_datasets(started):
+    """
+    Remove dataset files no row references, such as a file saved for an
+    analysis whose row insert then failed.
+    """
+    names = await asyncio.to_thread(_dataset_files)
+    removed = 0
+    for start in range(0, len(names), RETENTION_BATCH_SIZE):
+        removed += await _delete_orphaned_datasets(names[start:start + RETENTION_BATCH_SIZE], started)
+    return removed
+
+
+async def _storage_bytes():
+    """
+    Bytes counted against the size limit: live database data plus the dataset
+    files rows reference, so deleting rows can always bring it under the limit.
+    """
+    async with engine.connect() as conn:
+        names = list((await conn.execute(
+            select(AnalysisResult.dataset_file).where(AnalysisResult.dataset_file.is_not(None)).distinct()
+        )).scalars())
+    dataset_bytes = await asyncio.to_thread(_files_bytes, [dataset_path(name) for name in names])
+    return (await database_usage())["live_bytes"] + dataset_bytes
+
+
+async def apply_retention(retention_days=RETENTION_DAYS, max_bytes=RETENTION_MAX_DB_MB * 1024 * 1024):
+    """Delete analyses past the age limit, then the oldest past the size limit."""
+    started = time.time()
+    deleted = 0
+    removed_files = await _sweep_unreferenced_datasets(started)
+
+    if retention_days:
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        async with engine.begin() as conn:
+            rows = (await conn.execute(
+                select(AnalysisResult.id, AnalysisResult.dataset_file).where(AnalysisResult.upload_date < cutoff)
+            )).all()
+            if rows:
+                await _delete_analyses(conn, [row.id for row in rows])
+        deleted += len(rows)
+        removed_files += await _delete_orphaned_datasets(
+            [row.dataset_file for row in rows if row.dataset_file], started
+        )
+
+    if max_bytes:
+        while await _storage_bytes() > max_bytes:
+            async with engine.begin() as conn:
+                rows = (await conn.execute(
+                    select(AnalysisResult.id, AnalysisResult.dataset_file)
+                    .order_by(AnalysisResult.upload_date, AnalysisResult.id)
+                    .limit(RETENTION_BATCH_SIZE)
+                )).all()
+                if not rows:
+                    break
+                await _delete_analyses(conn, [row.id for row in rows])
+            deleted += len(rows)
+            # Removed per batch so the freed file space counts towards the limit
+            removed_files += await _delete_orphaned_datasets(
+                [row.dataset_file for row in rows if row.dataset_file], started
+            )
+
+    return {"deleted_analyses": deleted, "deleted_dataset_files": removed_files}
+
+
+async def incremental_vacuum():
+    """Return free pages to the file system. Returns the bytes released."""
+    before = (await database_usage())["file_bytes"]
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("PRAGMA incremental_vacuum"))
+        # Keep the write-ahead log from holding on to the released space
+        await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+    return before - (await database_usage())["file_bytes"]
+
+
+async def run_maintenance():
+    """Apply retention, then compact the file."""
+    report = await apply_retention()
+    report["vacuumed_bytes"] = await incremental_vacuum()
+    return report
+
+
+def _dataset_files():
+    try:
+        return [name for name in os.listdir(DATASET_DIR) if name.endswith(".parquet")]
+    except FileNotFoundError:
+        return []
+
+
+def _files_bytes(paths):
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+async def storage_report():
+    """Storage used by tables, result sections and dataset files."""
+    async with engine.connect() as conn:
+        try:
+            tables = {
+                row.name: row.bytes for row in (await conn.execute(
+                    text("SELECT name, SUM(pgsize) AS bytes FROM dbstat GROUP BY name ORDER BY bytes DESC")
+                ))
+            }
+        except Exception:
+            # SQLite built without the dbstat table
+            tables = None
+        analyses = (await conn.execute(select(
+            func.count(AnalysisResult.id),
+            func.coalesce(func.sum(func.length(AnalysisResult.result_data)), 0),
+            func.coalesce(func.sum(func.length(AnalysisResult.data_preview)), 0),
+            func.min(AnalysisResult.upload_date),
+        ))).one()
+        sections = {
+            row.name: {
+                "count": row.count,
+                "raw_bytes": row.raw_bytes or 0,
+                "stored_bytes": row.stored_bytes or 0,
+            }
+            for row in (await conn.execute(select(
+                AnalysisSection.name,
+                func.count().label("count"),
+                func.sum(AnalysisSection.raw_size).label("raw_bytes"),
+                func.sum(func.length(AnalysisSection.data)).label("stored_bytes"),
+            ).group_by(AnalysisSection.name)))
+        }
+
+    return {
+        "database": await database_usage(),
+        "tables": tables,
+        "analyses": {
+            "count": analyses[0],
+            "result_bytes": analyses[1],
+            "preview_bytes": analyses[2],
+            "oldest": analyses[3].isoformat() if analyses[3] else None,
+        },
+        "sections": sections,
+        "dataset_files_bytes": await asyncio.to_thread(_directory_bytes, DATASET_DIR),
+        "retention": {
+            "days": RETENTION_DAYS,
+            "max_bytes": RETENTION_MAX_DB_MB * 1024 * 1024,
+        },
+    }
+
+
+async def maintenance_loop():
+    """Run maintenance every MAINTENANCE_INTERVAL_HOURS."""
+    while True:
+        try:
+            report = await run_maintenance()
+            logger.info("Database maintenance: %s", report)
+        except Exception:
+            logger.exception("Database maintenance failed")
+        await asyncio.sleep(MAINTENANCE_INTERVAL_HOURS * 3600)
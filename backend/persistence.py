@@ -0,0 +1,188 @@
+"""
+Write-behind persistence of analyses.
+Uploads hand their finished analysis to a queue and respond straight away; a
+background task writes queued analyses in batches, one transaction per batch,
+retrying when SQLite's write lock is busy.
+
+Durability: an analysis is durable once its batch commits, normally within
+PERSIST_FLUSH_INTERVAL_MS of the upload (longer under lock contention, by up
+to PERSIST_MAX_RETRIES backed-off retries). The future returned by submit()
+resolves to the row id at that point, and flush() waits until everything
+queued so far is committed. A graceful shutdown flushes the queue; analyses
+still queued when the process is killed are lost, as are analyses whose
+writes keep failing after the retries (counted as "failed" in stats()).
+"""
+
+import asyncio
+import logging
+import os
+import random
+
+from sqlalchemy.exc import OperationalError
+
+from database import AnalysisResult, SessionLocal
+from dataset_store import save_dataset
+from result_storage import SPLIT_FORMAT, split_for_storage
+
+logger = logging.getLogger(__name__)
+
+PERSIST_BATCH_SIZE = int(os.environ.get("PERSIST_BATCH_SIZE", "20"))
+PERSIST_FLUSH_INTERVAL_MS = int(os.environ.get("PERSIST_FLUSH_INTERVAL_MS", "200"))
+PERSIST_MAX_RETRIES = int(os.environ.get("PERSIST_MAX_RETRIES", "5"))
+PERSIST_RETRY_BASE_MS = 100
+
+
+class PersistenceQueue:
+    """Batches analysis inserts into grouped transactions in a background task."""
+
+    def __init__(self, batch_size, flush_interval_ms, max_retries):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self._queue = None
+        self._task = None
+        self.committed = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+    def start(self):
+        """Start the writer task on the running event loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    def submit(self, fields, result, df=None, fingerprint=None):
+        """
+        Queue an analysis for saving. fields are AnalysisResult columns; the
+        result is stored in split form, and df, when given, as the analysis's
+        dataset file. Returns a future resolving to the saved row id.
+        """
+        self.start()
+        saved = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait({
+            "fields": dict(fields),
+            "result": result,
+            "df": df,
+            "fingerprint": fingerprint,
+            "saved": saved,
+        })
+        return saved
+
+    async def flush(self):
+        """Wait until everything queued so far has been written (or has failed)."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def stop(self):
+        """Flush the queue and stop the writer task."""
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write_batch(batch)
+            except Exception as exc:
+                logger.exception("Saving analyses failed")
+                self._fail(batch, exc)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, batch):
+        # Dataset files are written before, and outside, the transaction
+        for item in batch:
+            if item["df"] is not None:
+                try:
+                    item["fields"]["dataset_file"] = await asyncio.to_thread(
+                        save_dataset, item["df"], item["fingerprint"]
+                    )
+                except Exception as exc:
+                    logger.warning("Dataset save failed: %s", exc)
+                item["df"] = None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                ids = await self._insert(batch)
+                break
+            except OperationalError as exc:
+                # Typically "database is locked": back off and retry the batch
+                if attempt == self.max_retries:
+                    logger.error("Saving %d analyses failed after %d retries: %s", len(batch), attempt, exc)
+                    self._fail(batch, exc)
+                    return
+                self.retries += 1
+                delay = PERSIST_RETRY_BASE_MS * (2 ** attempt) / 1000
+                await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            except Exception as exc:
+                if len(batch) == 1:
+                    logger.warning("Database save failed: %s", exc)
+                    self._fail(batch, exc)
+                    return
+                # Keep one bad analysis from failing the rest of its batch
+                for item in batch:
+                    await self._write_batch([item])
+                return
+
+        self.batches += 1
+        self.committed += len(batch)
+        for item, row_id in zip(batch, ids):
+            if not item["saved"].done():
+                item["saved"].set_result(row_id)
+
+    async def _insert(self, batch):
+        """Insert a batch in one transaction and return the new row ids."""
+        # Serializing and compressing the sections is kept off the event loop
+        split = await asyncio.to_thread(lambda: [split_for_storage(item["result"]) for item in batch])
+        async with SessionLocal() as db:
+            pending = []
+            for item, (meta, section_rows) in zip(batch, split):
+                row = AnalysisResult(**item["fields"], result_data=meta, storage_format=SPLIT_FORMAT)
+                db.add(row)
+                pending.append((row, section_rows))
+            await db.flush()
+            for row, section_rows in pending:
+                for section in section_rows:
+                    section.analysis_id = row.id
+                db.add_all(section_rows)
+            await db.commit()
+            return [row.id for row, _ in pending]
+
+    def _fail(self, batch, exc):
+        for item in batch:
+            if not item["saved"].done():
+                self.failed += 1
+                item["saved"].set_exception(exc)
+                # Nobody may await the future; mark the exception as retrieved
+                item["saved"].exception()
+
+    def stats(self):
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "committed": self.committed,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+persistence = PersistenceQueue(PERSIST_BATCH_SIZE, PERSIST_FLUSH_INTERVAL_MS, PERSIST_MAX_RETRIES)
@@ -0,0 +1,306 @@
+"""
+Local answers to computational chat questions.
+Questions asking for an aggregate, a group-by, top values, a filtered count,
+correlations, missing values or descriptive statistics of named columns are
+recognised by pattern and answered exactly from the session's full DataFrame
+through chatbot.answer_specific_query. Anything else, or anything the router
+cannot parse completely, is left to the LLM.
+"""
+
+import operator
+import re
+
+from chatbot import answer_specific_query
+
+# Categorical columns with more distinct values are not searched for values
+MAX_INDEXED_VALUES = 500
+# Groups listed in a group-by answer unless the question asks for a number
+GROUP_LIMIT = 20
+
+# Questions that ask for judgement rather than a number
+OPEN_ENDED = re.compile(
+    r"\b(why|explain|should|recommend|suggest|insights?|interpret|predict|forecast|trends?|patterns?|"
+    r"seasonal|outliers?|anomal\w*|summari[sz]e|chart|plot|visuali[sz]\w*)\b",
+    re.IGNORECASE,
+)
+# Words that restrict rows; a question using them must yield a parsed filter
+RESTRICTION = re.compile(r"\b(where|only)\b", re.IGNORECASE)
+# Negations, comparisons between groups and numbers that no parsed condition
+# accounts for: a local answer would silently ignore them
+UNPARSED = re.compile(
+    r"\b(not|ignor\w*|without|except|excluding|exclude[sd]?|other than|apart from|vs|versus|than|"
+    r"compar\w*|difference between)\b|(?<!\w)\d",
+    re.IGNORECASE,
+)
+# Categorical values too common in questions to be read as a condition
+STOPWORDS = {
+    "no", "yes", "true", "false", "none", "all", "other", "others", "total", "and", "or", "the",
+    "of", "in", "on", "at", "by", "per", "is", "an", "to", "for", "with", "what", "which",
+    "how", "many", "much", "average", "mean", "sum", "count", "max", "min", "top", "each",
+}
+
+AGGREGATE_WORDS = [
+    ("mean", r"average|avg|mean"),
+    ("sum", r"sum|total"),
+    ("median", r"median"),
+    ("std", r"standard deviation|std(?: dev)?"),
+    ("max", r"max|maximum|highest|largest|biggest"),
+    ("min", r"min|minimum|lowest|smallest"),
+]
+AGGREGATES = [(agg, re.compile(rf"\b(?:{words})\b", re.IGNORECASE)) for agg, words in AGGREGATE_WORDS]
+COUNT = re.compile(r"\b(how many|count|number of)\b", re.IGNORECASE)
+ROWS = re.compile(r"\b(rows|records|entries|observations|lines)\b", re.IGNORECASE)
+UNIQUE = re.compile(r"\b(unique|distinct)\b", re.IGNORECASE)
+MISSING = re.compile(r"\b(missing|null|nulls|nan|empty)\b", re.IGNORECASE)
+DESCRIBE = re.compile(r"\b(describe|descriptive statistics|summary statistics|statistical summary)\b", re.IGNORECASE)
+CORRELATION = re.compile(r"\b(correlat\w*|relationship between)\b", re.IGNORECASE)
+FREQUENCY = re.compile(
+    r"\b(most common|most frequent|least common|most often|top values|frequenc\w*|distribution|breakdown|value counts|"
+    r"how many of each)\b",
+    re.IGNORECASE,
+)
+RANKING = re.compile(r"\b(which|top|bottom|rank\w*|most|least|best|worst|fewest)\b", re.IGNORECASE)
+ASCENDING = re.compile(r"\b(lowest|least|bottom|smallest|worst|fewest|minimum|min)\b", re.IGNORECASE)
+GROUP_BY = re.compile(r"\b(?:by|per|for each|each|across|grouped by|which)\s*$", re.IGNORECASE)
+TOP_N = re.compile(r"\b(?:top|bottom|first|last)\s+(\d+)\b", re.IGNORECASE)
+
+NUMBER = r"-?\d[\d,]*(?:\.\d+)?"
+COMPARISONS = [
+    (">=", r">=|greater than or equal to|at least"),
+    ("<=", r"<=|less than or equal to|at most"),
+    ("!=", r"!=|not equal to"),
+    (">", r">|greater than|more than|above|over|exceeding"),
+    ("<", r"<|less than|fewer than|below|under"),
+    ("==", r"==|=|equals|equal to|is"),
+]
+OPERATORS = {
+    ">=": operator.ge, "<=": operator.le, "!=": operator.ne, ">": operator.gt, "<": operator.lt, "==": operator.eq,
+}
+COMPARISON_WORDS = {
+    ">=": "at least", "<=": "at most", "!=": "not equal to", ">": "above", "<": "below", "==": "equal to",
+}
+COMPARISON = re.compile(
+    r"\s*(?:is\s+)?(?:(?:" + "|".join(f"(?P<op{idx}>{words})" for idx, (_, words) in enumerate(COMPARISONS))
+    + r")\s*(?P<value>" + NUMBER + r")|between\s+(?P<low>" + NUMBER + r")\s+and\s+(?P<high>" + NUMBER + r"))",
+    re.IGNORECASE,
+)
+ANY_COMPARISON = re.compile(
+    r"(?:between|" + "|".join(words for op, words in COMPARISONS if op != "==") + r")\s*" + NUMBER,
+    re.IGNORECASE,
+)
+
+
+def _number(text):
+    return float(text.replace(",", ""))
+
+
+def _column_pattern(name):
+    # Underscores in a column name may be written as spaces
+    spelled = re.escape(str(name)).replace("_", "[_ ]")
+    return re.compile(r"(?<!\w)" + spelled + r"(?!\w)", re.IGNORECASE)
+
+
+class QueryEngine:
+    """
+    Router for one dataset: finds the columns, values and conditions a
+    question names and, for computational questions, the answer.
+    """
+
+    def __init__(self, df, columns, fingerprint=None):
+        self.df = df
+        self.columns = columns or {}
+        self.fingerprint = fingerprint
+        self.numeric = [col for col in self.columns.get('numeric', []) if col in df.columns]
+        self.categorical = [col for col in self.columns.get('categorical', []) if col in df.columns]
+        # Longest names first, so "unit price" wins over "price"
+        self._column_patterns = [
+            (col, _column_pattern(col))
+            for col in sorted(df.columns, key=lambda col: len(str(col)), reverse=True)
+        ]
+        self._value_pattern = None
+        self._value_columns = None
+
+    def _mentions(self, message):
+        """Every naming of a column in the message, as (column, start, end) in message order."""
+        taken = []
+        for col, pattern in self._column_patterns:
+            for match in pattern.finditer(message):
+                if not any(start < match.end() and match.start() < end for _, start, end in taken):
+                    taken.append((col, match.start(), match.end()))
+        return sorted(taken, key=lambda mention: mention[1])
+
+    def _build_value_index(self):
+        columns = {}
+        names = {str(col).lower() for col in self.df.columns}
+        for col in self.categorical:
+            values = self.df[col].dropna().unique()
+            if len(values) > MAX_INDEXED_VALUES:
+                continue
+            for value in values:
+                key = str(value).strip().lower()
+                if len(key) < 2 or key in names or key in STOPWORDS or re.fullmatch(r"[\d.,\s-]+", key):
+                    continue
+                columns.setdefault(key, []).append((col, value))
+        # Values appearing in several columns are ambiguous
+        self._value_columns = {key: found[0] for key, found in columns.items() if len(found) == 1}
+        if self._value_columns:
+            alternatives = sorted(self._value_columns, key=len, reverse=True)
+            self._value_pattern = re.compile(
+                r"(?<!\w)(" + "|".join(map(re.escape, alternatives)) + r")(?!\w)", re.IGNORECASE
+            )
+
+    def _filters(self, message, mentions):
+        """
+        Row conditions in the message: comparisons following a numeric column
+        and categorical values named outright. Returns (mask, description,
+        columns compared), or None when the message restricts or contrasts rows
+        in a way that was not understood.
+        """
+        conditions = []
+        compared = set()
+        consumed = []
+        for col, _, end in mentions:
+            if col not in self.numeric:
+                continue
+            match = COMPARISON.match(message, end)
+            if not match:
+                continue
+            if match.group("low") is not None:
+                low, high = _number(match.group("low")), _number(match.group("high"))
+                conditions.append((self.df[col].between(low, high), f"{col} between {low:g} and {high:g}"))
+            else:
+                op = next(op for idx, (op, _) in enumerate(COMPARISONS) if match.group(f"op{idx}"))
+                value = _number(match.group("value"))
+                conditions.append((OPERATORS[op](self.df[col], value), f"{col} {COMPARISON_WORDS[op]} {value:g}"))
+            compared.add(col)
+            consumed.append((match.start(), match.end()))
+
+        # A comparison that follows no numeric column was not understood
+        for match in ANY_COMPARISON.finditer(message):
+            if not any(start <= match.start() < end for start, end in consumed):
+                return None
+
+        if self._value_columns is None:
+            self._build_value_index()
+        if self._value_pattern is not None:
+            selected = {}
+            for match in self._value_pattern.finditer(message):
+                col, value = self._value_columns[match.group(1).lower()]
+                selected.setdefault(col, []).append(value)
+                consumed.append(match.span())
+            for col, values in selected.items():
+                values = list(dict.fromkeys(values))
+                conditions.append((
+                    self.df[col].isin(values),
+                    f"{col} {'in ' + ', '.join(map(str, values)) if len(values) > 1 else 'equal to ' + str(values[0])}",
+                ))
+
+        # What remains once parsed conditions, column names and "top N" are
+        # removed must not negate, contrast or quote a number
+        consumed.extend((start, end) for _, start, end in mentions)
+        consumed.extend(match.span() for match in TOP_N.finditer(message))
+        rest = list(message)
+        for start, end in consumed:
+            rest[start:end] = " " * (end - start)
+        if UNPARSED.search("".join(rest)):
+            return None
+
+        if not conditions:
+            if RESTRICTION.search(message):
+                return None
+            return None, None, compared
+        mask = conditions[0][0]
+        for extra, _ in conditions[1:]:
+            mask = mask & extra
+        return mask, " and ".join(description for _, description in conditions), compared
+
+    def route(self, message):
+        """
+        The query for a message as (query type, DataFrame, kwargs) for
+        answer_specific_query, or None to leave the message to the LLM.
+        """
+        if not message or not message.strip() or OPEN_ENDED.search(message):
+            return None
+        mentions = self._mentions(message)
+        filters = self._filters(message, mentions)
+        if filters is None:
+            return None
+        mask, condition, compared = filters
+        df = self.df[mask] if mask is not None else self.df
+        kwargs = {"condition": condition} if condition else {}
+
+        named = list(dict.fromkeys(col for col, _, _ in mentions))
+        # Columns only used in a condition are not what is asked about
+        targets = [col for col in named if col in self.numeric and col not in compared]
+        numeric = targets or [col for col in named if col in self.numeric]
+        categorical = [col for col in named if col in self.categorical]
+        aggregates = [agg for agg, pattern in AGGREGATES if pattern.search(message)]
+        top_n = TOP_N.search(message)
+        n = int(top_n.group(1)) if top_n else None
+
+        if MISSING.search(message):
+            return "missing", df[named] if named else df, kwargs
+        if DESCRIBE.search(message):
+            return "describe", df, {**kwargs, "cols": numeric or None}
+        if CORRELATION.search(message):
+            if len(numeric) >= 2:
+                return "correlation", df, {"col1": numeric[0], "col2": numeric[1]}
+            return "top_correlations", df, {"col": numeric[0] if numeric else None, "n": n or 5}
+        if UNIQUE.search(message) and named:
+            return "unique", df, {**kwargs, "col": named[0]}
+
+        # Group-by: a categorical column introduced by "by", "per", "which"...
+        by = next(
+            (col for col, start, _ in mentions if col in categorical and GROUP_BY.search(message[:start])),
+            None,
+        )
+        if by is None and categorical and numeric and (aggregates or RANKING.search(message)):
+            by = categorical[0]
+        if by is not None:
+            # One grouping and one measure; questions naming more are left to the LLM
+            if len(categorical) > 1 or len(numeric) > 1:
+                return None
+            ranking = RANKING.search(message)
+            explicit = [agg for agg in aggregates if agg in ("mean", "sum", "median", "std")]
+            if numeric:
+                # With an explicit aggregate, "highest"/"lowest" rank the groups
+                if len(explicit) > 1 or (len(aggregates) > 1 and not explicit):
+                    return None
+                if explicit:
+                    agg = explicit[0]
+                elif re.search(r"\bmost\b", message, re.IGNORECASE):
+                    agg = "sum"
+                elif aggregates and not ranking:
+                    agg = aggregates[0]
+                else:
+                    agg = "mean"
+                query = {"col": numeric[0], "agg": agg}
+            elif not aggregates and (COUNT.search(message) or ROWS.search(message) or FREQUENCY.search(message)):
+                # Row counts only when asked for: "the most sales" without a
+                # sales column, or an average of a categorical column, is not
+                query = {}
+            else:
+                return None
+            if n is None:
+                n = 1 if re.search(r"\bwhich\b", message, re.IGNORECASE) and not top_n else GROUP_LIMIT
+            return "group_by", df, {
+                **kwargs, **query, "by": by, "n": n, "ascending": bool(ASCENDING.search(message)),
+            }
+
+        if numeric and aggregates:
+            if len(aggregates) > 1:
+                return None
+            return "aggregate", df, {**kwargs, "cols": numeric, "agg": aggregates[0]}
+        if len(categorical) == 1 and FREQUENCY.search(message):
+            return "top_values", df, {**kwargs, "col": categorical[0], "n": n or 5}
+        if COUNT.search(message) and (ROWS.search(message) or condition) and not targets:
+            return "row_count", df, {**kwargs, "total_rows": len(self.df)}
+        return None
+
+    def answer(self, message):
+        """The computed answer to a message, or None when it needs the LLM."""
+        route = self.route(message)
+        if route is None:
+            return None
+        query_type, df, kwargs = route
+        return answer_specific_query(query_type, df, self.columns, **kwargs)
@@ -0,0 +1,80 @@
+"""
+Background chart image rendering.
+matplotlib figures are rendered in a pool of worker processes so plotting
+never runs on the request path. Finished PNGs go to the shared chart image
+cache and are served by URL.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from chart_image_cache import chart_images
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", "2"))
+
+_executor = None
+_in_flight = {}  # image key -> concurrent.futures.Future resolving to PNG bytes
+_lock = threading.RLock()
+
+
+def get_executor():
+    """Return the render process pool, starting it on first use."""
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn keeps workers independent of the server's threads and event loop
+            _executor = ProcessPoolExecutor(
+                max_workers=RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def submit_render(key, render_fn, *args):
+    """
+    Return a future for the image stored under key in the chart image cache.
+    Cached images resolve immediately and in-flight renders are shared;
+    otherwise render_fn(*args) is scheduled in the render pool and its PNG is
+    added to the cache when done.
+    """
+    png = chart_images.get(key)
+    if png is not None:
+        future = Future()
+        future.set_result(png)
+        return future
+
+    with _lock:
+        future = _in_flight.get(key)
+        if future is not None:
+            return future
+        future = get_executor().submit(render_fn, *args)
+        _in_flight[key] = future
+
+    future.add_done_callback(lambda done: _finish_render(key, done))
+    return future
+
+
+def _finish_render(key, future):
+    with _lock:
+        _in_flight.pop(key, None)
+    if not future.cancelled() and future.exception() is None:
+        chart_images.put(key, future.result())
+
+
+def warm_up():
+    """Start the render workers and load the plotting stack in each of them."""
+    from report_generator import warm_up as warm_up_worker
+
+    executor = get_executor()
+    return [executor.submit(warm_up_worker) for _ in range(RENDER_WORKERS)]
+
+
+def shutdown():
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+        _in_flight.clear()
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
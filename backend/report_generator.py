@@ -1,144 +1,240 @@
-from fpdf import FPDF
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import logging
 import os
-import uuid
-import base64
+import numpy as np
+from functools import lru_cache
 from io import BytesIO
 
-class PDFReport(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 15)
-        self.cell(0, 10, 'Data Analysis Report', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
-
-    def chapter_title(self, title):
-        self.set_font('Arial', 'B', 12)
-        self.set_fill_color(200, 220, 255)
-        self.cell(0, 10, title, 0, 1, 'L', 1)
-        self.ln(4)
-
-    def chapter_body(self, body):
-        self.set_font('Arial', '', 10)
-        self.multi_cell(0, 5, body)
-        self.ln()
-        
-    def add_image(self, image_path, title):
-        self.set_font('Arial', 'B', 10)
-        self.cell(0, 10, title, 0, 1, 'L')
-        # Center image
-        self.image(image_path, x=15, w=180) 
-        self.ln(5)
-
-def generate_chart_images(df, columns):
+import render_pool
+from chart_image_cache import image_key
+from data_processor import dataset_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of jittered points drawn over a box plot
+BOXPLOT_STRIP_POINTS = int(os.environ.get("BOXPLOT_STRIP_POINTS", "2000"))
+# Rows drawn in the report's scatter plot (a fixed random sample beyond this)
+REPORT_SCATTER_MAX_POINTS = int(os.environ.get("REPORT_SCATTER_MAX_POINTS", "5000"))
+
+
+# matplotlib, seaborn and fpdf take seconds to import, so they are loaded on
+# first use instead of at server start-up.
+def _pyplot():
+    """Import matplotlib (headless Agg backend) and seaborn."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    return plt, sns
+
+
+@lru_cache(maxsize=None)
+def _pdf_report_class():
+    from fpdf import FPDF
+
+    class PDFReport(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 15)
+            self.cell(0, 10, 'Data Analysis Report', 0, 1, 'C')
+            self.ln(5)
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font('Arial', 'I', 8)
+            self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+        def chapter_title(self, title):
+            self.set_font('Arial', 'B', 12)
+            self.set_fill_color(200, 220, 255)
+            self.cell(0, 10, title, 0, 1, 'L', 1)
+            self.ln(4)
+
+        def chapter_body(self, body):
+            self.set_font('Arial', '', 10)
+            self.multi_cell(0, 5, body)
+            self.ln()
+
+        def add_image(self, png, title):
+            self.set_font('Arial', 'B', 10)
+            self.cell(0, 10, title, 0, 1, 'L')
+            # Center image
+            self.image(BytesIO(png), x=15, w=180) 
+            self.ln(5)
+
+    return PDFReport
+
+
+def warm_up():
+    """Import the plotting stack and build the matplotlib font cache ahead of the first render."""
+    from matplotlib import font_manager
+
+    _pyplot()
+    font_manager.findfont("DejaVu Sans")
+    _pdf_report_class()
+
+
+def boxplot_spec(column):
+    """Spec of the box plot image shown on the dashboard."""
+    return {"kind": "boxPlot", "columns": [column], "title": f"Box Plot of {column}"}
+
+
+def report_chart_specs(df, columns):
     """
-    Generates static chart images using matplotlib/seaborn.
-    Returns a list of dictionaries: [{"title": "...", "path": "..."}]
+    Charts included in the PDF report, as JSON-able specs.
+    Each spec names the columns it plots; with the dataset fingerprint it keys
+    the rendered image in the chart image cache.
     """
-    images = []
-    temp_dir = "temp_charts"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    # Set style
-    sns.set_theme(style="whitegrid")
-    
-    # 1. Histogram (Numeric)
+    specs = []
     numeric_cols = columns.get("numeric", [])
+    categorical_cols = columns.get("categorical", [])
+
+    # 1. Histogram (Numeric)
     if numeric_cols:
         col = numeric_cols[0]
-        plt.figure(figsize=(10, 6))
-        sns.histplot(data=df, x=col, kde=True, color="skyblue")
-        plt.title(f"Distribution of {col}")
-        
-        filename = f"{temp_dir}/{uuid.uuid4()}_hist.png"
-        plt.savefig(filename, bbox_inches='tight')
-        plt.close()
-        images.append({"title": f"Distribution of {col}", "path": filename})
-        
+        specs.append({"kind": "histogram", "columns": [col], "title": f"Distribution of {col}"})
+
     # 2. Bar Chart (Categorical)
-    categorical_cols = columns.get("categorical", [])
     if categorical_cols:
         col = categorical_cols[0]
         # Check cardinality to avoid mess
         if df[col].nunique() <= 15:
-            data_to_plot = df[col].value_counts().reset_index()
-            data_to_plot.columns = [col, "Count"]
-            
-            plt.figure(figsize=(10, 6))
-            sns.barplot(data=data_to_plot, x=col, y="Count", palette="viridis")
-            plt.title(f"Count of {col}")
-            plt.xticks(rotation=45)
-            
-            filename = f"{temp_dir}/{uuid.uuid4()}_bar.png"
-            plt.savefig(filename, bbox_inches='tight')
-            plt.close()
-            images.append({"title": f"Count of {col}", "path": filename})
-            
+            specs.append({"kind": "bar", "columns": [col], "title": f"Count of {col}"})
+
     # 3. Scatter Plot (Two Numeric)
     if len(numeric_cols) >= 2:
-        col_x = numeric_cols[0]
-        col_y = numeric_cols[1]
-        
-        plt.figure(figsize=(10, 6))
-        sns.scatterplot(data=df, x=col_x, y=col_y, color="purple", alpha=0.6)
-        plt.title(f"{col_x} vs {col_y}")
-        
-        filename = f"{temp_dir}/{uuid.uuid4()}_scatter.png"
-        plt.savefig(filename, bbox_inches='tight')
-        plt.close()
-        images.append({"title": f"{col_x} vs {col_y}", "path": filename})
-        
+        col_x, col_y = numeric_cols[0], numeric_cols[1]
+        specs.append({
+            "kind": "scatter",
+            "columns": [col_x, col_y],
+            "title": f"{col_x} vs {col_y}",
+            "max_points": REPORT_SCATTER_MAX_POINTS,
+        })
+
     # 4. Correlation Heatmap
     if len(numeric_cols) > 2:
+        specs.append({"kind": "heatmap", "columns": list(numeric_cols), "title": "Correlation Matrix"})
+
+    return specs
+
+
+def chart_spec_data(spec, df):
+    """
+    The rows and columns of df a chart spec plots. Scatter plots are sampled
+    down to their point budget so workers receive and draw only what is shown.
+    """
+    data = df[spec["columns"]]
+    max_points = spec.get("max_points")
+    if max_points and len(data) > max_points:
+        data = data.sample(n=max_points, random_state=0)
+    return data
+
+
+def render_chart_png(spec, data):
+    """
+    Renders one chart spec to PNG bytes using matplotlib/seaborn.
+    data holds the spec's columns. Runs in the render worker processes too.
+    """
+    kind = spec["kind"]
+    if kind == "boxPlot":
+        col = spec["columns"][0]
+        return render_boxplot_png(data[col].dropna().to_numpy(), col)
+
+    plt, sns = _pyplot()
+
+    # Set style
+    sns.set_theme(style="whitegrid")
+
+    if kind == "histogram":
+        plt.figure(figsize=(10, 6))
+        sns.histplot(data=data, x=spec["columns"][0], kde=True, color="skyblue")
+    elif kind == "bar":
+        col = spec["columns"][0]
+        data_to_plot = data[col].value_counts().reset_index()
+        data_to_plot.columns = [col, "Count"]
+
+        plt.figure(figsize=(10, 6))
+        sns.barplot(data=data_to_plot, x=col, y="Count", palette="viridis")
+        plt.xticks(rotation=45)
+    elif kind == "scatter":
+        col_x, col_y = spec["columns"]
+        plt.figure(figsize=(10, 6))
+        sns.scatterplot(data=data, x=col_x, y=col_y, color="purple", alpha=0.6)
+    elif kind == "heatmap":
         plt.figure(figsize=(10, 8))
-        corr = df[numeric_cols].corr()
-        sns.heatmap(corr, annot=True, cmap="coolwarm", fmt=".2f")
-        plt.title("Correlation Matrix")
-        
-        filename = f"{temp_dir}/{uuid.uuid4()}_heatmap.png"
-        plt.savefig(filename, bbox_inches='tight')
-        plt.close()
-        images.append({"title": "Correlation Matrix", "path": filename})
-        
+        sns.heatmap(data.corr(), annot=True, cmap="coolwarm", fmt=".2f")
+    else:
+        raise ValueError(f"Unsupported report chart: {kind}")
+
+    plt.title(spec["title"])
+
+    buf = BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight')
+    plt.close()
+    return buf.getvalue()
+
+
+def generate_chart_images(df, columns, fingerprint=None):
+    """
+    Generates static chart images for the report.
+    Images already rendered for this dataset are read from the chart image
+    cache; the rest are rendered in parallel in the render pool.
+    Returns a list of dictionaries: [{"title": "...", "png": b"..."}]
+    """
+    if fingerprint is None:
+        fingerprint = dataset_fingerprint(df)
+
+    specs = report_chart_specs(df, columns)
+    futures = [
+        render_pool.submit_render(image_key(fingerprint, spec), render_chart_png, spec, chart_spec_data(spec, df))
+        for spec in specs
+    ]
+
+    images = []
+    for spec, future in zip(specs, futures):
+        try:
+            images.append({"title": spec["title"], "png": future.result()})
+        except Exception:
+            # The report is still generated, without this chart
+            logger.exception("Rendering %s chart for report failed", spec["kind"])
+
     return images
 
 
-def generate_seaborn_boxplot_base64(df, column):
+def render_boxplot_png(values, column, max_strip_points=BOXPLOT_STRIP_POINTS):
     """
-    Generates a high-quality Seaborn boxplot and returns it as a base64 string.
+    Renders a high-quality Seaborn boxplot of values and returns the PNG bytes.
+    The box is computed from every value; the jittered strip plot on top is
+    capped at max_strip_points sampled values.
+    Runs in the render worker processes, so it only takes picklable arguments.
     """
-    try:
-        # Set style
-        sns.set_theme(style="whitegrid", palette="pastel")
-        plt.figure(figsize=(8, 5))
-        
-        # Create boxplot
-        ax = sns.boxplot(data=df, y=column, color="#f08080")
-        sns.stripplot(data=df, y=column, color="#333", alpha=0.3, size=4) # Add jitter for better visualization
-        
-        plt.title(f"Statistical Distribution of {column}", fontsize=14, fontweight='bold', pad=15)
-        plt.ylabel(column, fontsize=12)
-        
-        # Save to buffer
-        buf = BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
-        plt.close()
-        
-        # Encode to base64
-        base64_str = base64.b64encode(buf.getvalue()).decode('utf-8')
-        return f"data:image/png;base64,{base64_str}"
-    except Exception as e:
-        print(f"Error generating Seaborn boxplot: {e}")
-        return None
-
-def generate_pdf_report(analysis_results, df=None, columns=None, filename="report.pdf"):
-    pdf = PDFReport()
+    values = np.asarray(values, dtype=float)
+    strip_values = values
+    if len(values) > max_strip_points:
+        rng = np.random.default_rng(0)
+        strip_values = rng.choice(values, size=max_strip_points, replace=False)
+
+    plt, sns = _pyplot()
+
+    # Set style
+    sns.set_theme(style="whitegrid", palette="pastel")
+    plt.figure(figsize=(8, 5))
+    
+    # Create boxplot
+    sns.boxplot(y=values, color="#f08080")
+    sns.stripplot(y=strip_values, color="#333", alpha=0.3, size=4) # Add jitter for better visualization
+    
+    plt.title(f"Statistical Distribution of {column}", fontsize=14, fontweight='bold', pad=15)
+    plt.ylabel(column, fontsize=12)
+    
+    # Save to buffer
+    buf = BytesIO()
+    plt.savefig(buf, format='png', bbox_inches='tight', dpi=100)
+    plt.close()
+    return buf.getvalue()
+
+
+def generate_pdf_report(analysis_results, df=None, columns=None, filename="report.pdf", fingerprint=None):
+    pdf = _pdf_report_class()()
     pdf.add_page()
     
     # 1. Overview
@@ -180,18 +276,11 @@ def generate_pdf_report(analysis_results, df=None, columns=None, filename="repor
         pdf.chapter_title("Visualizations")
         
         try:
-            images = generate_chart_images(df, columns)
+            images = generate_chart_images(df, columns, fingerprint or analysis_results.get("fingerprint"))
             for img in images:
                 if pdf.get_y() > 200: # Check for page break needed
                     pdf.add_page()
-                pdf.add_image(img["path"], img["title"])
-                
-            # Cleanup
-            for img in images:
-                try:
-                    os.remove(img["path"])
-                except:
-                    pass
+                pdf.add_image(img["png"], img["title"])
         except Exception as e:
             pdf.chapter_body(f"Could not generate charts: {str(e)}")
     
@@ -203,4 +292,4 @@ def generate_pdf_report(analysis_results, df=None, columns=None, filename="repor
     pdf.chapter_body(text)
     
     # Output
-    return pdf.output(dest='S').encode('latin-1', errors='replace')
+    return bytes(pdf.output())
@@ -0,0 +1,142 @@
+"""
+On-disk store of generated PDF reports.
+Reports are built in the background as soon as an analysis completes and kept
+as files keyed by analysis id and content hash, so downloads stream a finished
+file. The store is bounded by total size; least recently used reports are
+removed first.
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+REPORT_STORE_DIR = os.environ.get(
+    "REPORT_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "report_store")
+)
+REPORT_STORE_MAX_MB = int(os.environ.get("REPORT_STORE_MAX_MB", "256"))
+
+
+class ReportStore:
+    """Size-bounded directory of PDF reports with background generation."""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._executor = None
+        self._in_flight = {}  # (analysis id, content hash) -> Future resolving to the report path
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def path(self, analysis_id, content_hash):
+        return os.path.join(self.directory, f"{analysis_id}-{content_hash}.pdf")
+
+    def get(self, analysis_id, content_hash):
+        """Path of the stored report, or None when it is not in the store."""
+        path = self.path(analysis_id, content_hash)
+        try:
+            # The modification time records recency for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, analysis_id, content_hash, pdf_bytes):
+        """Store a report and return its path."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(analysis_id, content_hash)
+        # Written under a temporary name so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+        return path
+
+    def submit(self, analysis_id, content_hash, build_fn, *args):
+        """
+        Return a future for the path of a stored report. Stored reports
+        resolve immediately and in-flight builds are shared; otherwise
+        build_fn(*args) is run in the background and its PDF bytes stored.
+        """
+        path = self.get(analysis_id, content_hash)
+        with self._lock:
+            if path is not None:
+                self.hits += 1
+                future = Future()
+                future.set_result(path)
+                return future
+
+            self.misses += 1
+            key = (analysis_id, content_hash)
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report")
+            future = self._executor.submit(self._build, analysis_id, content_hash, build_fn, args)
+            self._in_flight[key] = future
+
+        future.add_done_callback(lambda _: self._finish(key))
+        return future
+
+    def _build(self, analysis_id, content_hash, build_fn, args):
+        return self.put(analysis_id, content_hash, build_fn(*args))
+
+    def _finish(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _evict(self, keep):
+        try:
+            entries = [
+                entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(".pdf")
+            ]
+        except FileNotFoundError:
+            return
+        stats = [(entry.path, entry.stat()) for entry in entries]
+        total = sum(stat.st_size for _, stat in stats)
+        for path, stat in sorted(stats, key=lambda item: item[1].st_mtime):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+            with self._lock:
+                self.evictions += 1
+
+    def stats(self):
+        try:
+            sizes = [
+                entry.stat().st_size for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(".pdf")
+            ]
+        except FileNotFoundError:
+            sizes = []
+        with self._lock:
+            return {
+                "reports": len(sizes),
+                "bytes": sum(sizes),
+                "max_bytes": self.max_bytes,
+                "pending": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._in_flight.clear()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+report_store = ReportStore(REPORT_STORE_DIR, REPORT_STORE_MAX_MB * 1024 * 1024)
@@ -0,0 +1,177 @@
+"""
+Split storage of analysis results.
+A saved result is kept as a small metadata record (the analysis_results row)
+plus compressed sections in analysis_sections, so history listings and item
+loads read only the parts a client asks for. Sections are compressed with
+zstd when the zstandard package is installed, otherwise with zlib; the codec
+is recorded per section.
+"""
+
+import logging
+import zlib
+
+import orjson
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from database import AnalysisResult, AnalysisSection, SessionLocal
+from serialization import dumps
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; zlib is always available
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+# storage_format of rows whose result is split into sections
+SPLIT_FORMAT = "split"
+# Rows converted per transaction by compact_legacy_results
+COMPACT_BATCH_SIZE = 50
+
+# Result fields moved out of the metadata record, by section
+SECTION_FIELDS = {
+    "charts": ("recommended_charts", "chart_interpretations"),
+    "details": ("cleaning_report", "metadata", "summary"),
+    "preview": ("data",),
+}
+# Inline chart images (base64 PNGs of older analyses) go to their own section
+IMAGES_SECTION = "images"
+SECTION_NAMES = tuple(SECTION_FIELDS) + (IMAGES_SECTION,)
+
+
+def compress_section(payload):
+    """Encode and compress a section payload. Returns (codec, data, raw size)."""
+    raw = dumps(payload)
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw), len(raw)
+    return "zlib", zlib.compress(raw, ZLIB_LEVEL), len(raw)
+
+
+def decompress_section(codec, data):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read this analysis section")
+        raw = zstandard.ZstdDecompressor().decompress(data)
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    else:
+        raise ValueError(f"Unknown section codec: {codec}")
+    return orjson.loads(raw)
+
+
+def split_result(result):
+    """Split a result into its metadata record and a dict of section payloads."""
+    meta = dict(result)
+    sections = {}
+    for name, fields in SECTION_FIELDS.items():
+        payload = {field: meta.pop(field) for field in fields if field in meta}
+        if payload:
+            sections[name] = payload
+
+    charts = sections.get("charts", {}).get("recommended_charts")
+    if charts:
+        images = {}
+        stripped = []
+        for idx, chart in enumerate(charts):
+            if chart.get("imageData"):
+                images[str(idx)] = chart["imageData"]
+                chart = {key: value for key, value in chart.items() if key != "imageData"}
+            stripped.append(chart)
+        if images:
+            sections["charts"]["recommended_charts"] = stripped
+            sections[IMAGES_SECTION] = images
+    return meta, sections
+
+
+def merge_result(meta, sections):
+    """Rebuild a result (or the requested part of it) from metadata and loaded sections."""
+    result = dict(meta)
+    for name, payload in sections.items():
+        if name != IMAGES_SECTION:
+            result.update(payload)
+
+    images = sections.get(IMAGES_SECTION)
+    if images and result.get("recommended_charts"):
+        result["recommended_charts"] = [
+            {**chart, "imageData": images[str(idx)]} if str(idx) in images else chart
+            for idx, chart in enumerate(result["recommended_charts"])
+        ]
+    return result
+
+
+def split_for_storage(result):
+    """
+    Return the metadata record to store in result_data, listing the available
+    sections, and the AnalysisSection rows (without analysis_id) for the rest.
+    """
+    meta, sections = split_result(result)
+    meta["sections"] = sorted(sections)
+    rows = []
+    for name, payload in sections.items():
+        codec, data, raw_size = compress_section(payload)
+        rows.append(AnalysisSection(name=name, codec=codec, raw_size=raw_size, data=data))
+    return meta, rows
+
+
+async def load_sections(db, analysis_id, names):
+    """Decompress the named sections of an analysis into {name: payload}."""
+    if not names:
+        return {}
+    rows = (await db.execute(
+        select(AnalysisSection.name, AnalysisSection.codec, AnalysisSection.data).where(
+            AnalysisSection.analysis_id == analysis_id, AnalysisSection.name.in_(names)
+        )
+    )).all()
+    return {row.name: decompress_section(row.codec, row.data) for row in rows}
+
+
+async def update_sections(analysis_id, result, names):
+    """Rewrite the named sections of a saved split-storage analysis from its result."""
+    _, sections = split_result(result)
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(AnalysisSection).where(
+                AnalysisSection.analysis_id == analysis_id, AnalysisSection.name.in_(names)
+            )
+        )).scalars().all()
+        for row in rows:
+            if row.name in sections:
+                row.codec, row.data, row.raw_size = compress_section(sections[row.name])
+        await db.commit()
+
+
+async def compact_legacy_results(batch_size=COMPACT_BATCH_SIZE):
+    """
+    Convert rows saved with the whole result inline to split storage, a batch
+    per transaction. Returns the number of rows converted. The database file
+    only shrinks once the freed pages are vacuumed.
+    """
+    converted = 0
+    while True:
+        async with SessionLocal() as db:
+            items = (await db.execute(
+                select(AnalysisResult).where(AnalysisResult.storage_format.is_(None)).limit(batch_size)
+            )).scalars().all()
+            if not items:
+                return converted
+            for item in items:
+                result = item.result_data if isinstance(item.result_data, dict) else {}
+                if "data" not in result and item.data_preview:
+                    result = {**result, "data": item.data_preview}
+                meta, section_rows = split_for_storage(result)
+                for row in section_rows:
+                    row.analysis_id = item.id
+                db.add_all(section_rows)
+                item.result_data = meta
+                item.data_preview = None
+                item.storage_format = SPLIT_FORMAT
+            try:
+                await db.commit()
+            except IntegrityError:
+                # Another server worker is converting the same rows
+                logger.info("Legacy result compaction is running elsewhere; stopping")
+                return converted
+            converted += len(items)
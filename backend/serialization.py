@@ -0,0 +1,153 @@
+"""
+Fast JSON encoding for API responses and database persistence.
+NumPy scalars and arrays, pandas timestamps and NaN values are serialized
+natively by orjson in a single pass, without first walking the payload to
+convert them to Python types.
+
+Also provides the opt-in columnar and Arrow IPC encodings for tabular
+payloads (chart data and the upload preview).
+"""
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.responses import JSONResponse
+
+# NaN/inf floats are always written as null by orjson
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(obj):
+    """Encode the values orjson does not handle natively."""
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, np.ndarray):
+        # Object arrays (strings, mixed values) are not covered by OPT_SERIALIZE_NUMPY
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, (pd.Timedelta, pd.Period, pd.Interval)):
+        return str(obj)
+    if obj is pd.NaT or obj is pd.NA:
+        return None
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _datetime_value(value):
+    """A datetime64/timedelta64 scalar as the pandas path writes it, NaT as None."""
+    if np.isnat(value):
+        return None
+    if value.dtype.kind == "M":
+        return pd.Timestamp(value).isoformat()
+    return str(pd.Timedelta(value))
+
+
+def _normalize(obj):
+    """
+    Convert what orjson rejects to encodable values: dict keys that are NumPy
+    scalars or timestamps become strings, and datetime64/timedelta64 arrays
+    and scalars (orjson cannot encode NaT in them) become ISO strings or None.
+    """
+    if isinstance(obj, dict):
+        normalized = {}
+        for key, value in obj.items():
+            if isinstance(key, np.generic):
+                key = key.item()
+            if not isinstance(key, (str, int, float, bool)) and key is not None:
+                key = str(key)
+            normalized[key] = _normalize(value)
+        return normalized
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(item) for item in obj]
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in "mM":
+        values = np.array([_datetime_value(value) for value in obj.ravel()], dtype=object)
+        return values.reshape(obj.shape).tolist()
+    if isinstance(obj, (np.datetime64, np.timedelta64)):
+        return _datetime_value(obj)
+    return obj
+
+
+def dumps(obj):
+    """Serialize obj to JSON bytes."""
+    try:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        # Rare payloads with NumPy or timestamp dict keys, or NaT in datetime64
+        # arrays, need a conversion pass first
+        return orjson.dumps(_normalize(obj), default=_default, option=ORJSON_OPTIONS)
+
+
+def dumps_str(obj):
+    """Serialize obj to a JSON string (used as the SQLAlchemy JSON serializer)."""
+    return dumps(obj).decode("utf-8")
+
+
+class NumpyJSONResponse(JSONResponse):
+    """JSON response that encodes NumPy/pandas values directly with orjson."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+def _column_values(series):
+    """Return (dtype label, values) for one column of a columnar payload."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Epoch milliseconds; NaT becomes null
+        millis = series.to_numpy(dtype="datetime64[ms]").astype("int64")
+        if series.hasnans:
+            millis = np.where(series.isna().to_numpy(), np.nan, millis)
+        return "datetime64[ms]", millis
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        return "bool", series.to_numpy(dtype=bool)
+    if pd.api.types.is_integer_dtype(series) and not series.hasnans:
+        return "int64", series.to_numpy(dtype="int64")
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "float64", series.to_numpy(dtype="float64", na_value=np.nan)
+    values = series.astype(object).where(series.notna(), None)
+    return "object", values.tolist()
+
+
+def to_columnar(frame, delta_columns=()):
+    """
+    Encode a DataFrame as {"format": "columnar", "length": n, "columns": {...}},
+    mapping each column name to its dtype and a typed array instead of
+    repeating every key per row.
+    Sorted integer or datetime columns listed in delta_columns are sent as a
+    start value plus successive differences ("encoding": "delta").
+    """
+    columns = {}
+    for name in frame.columns:
+        dtype, values = _column_values(frame[name])
+        column = {"dtype": dtype, "values": values}
+
+        is_integral = dtype in ("int64", "datetime64[ms]") and values.dtype == np.int64
+        if name in delta_columns and is_integral and len(values) > 1:
+            deltas = np.diff(values)
+            if (deltas >= 0).all():
+                column = {"dtype": dtype, "encoding": "delta", "start": values[0], "values": deltas}
+
+        columns[str(name)] = column
+
+    return {"format": "columnar", "length": len(frame), "columns": columns}
+
+
+def to_arrow_ipc(frame, metadata=None):
+    """
+    Encode a DataFrame as an Arrow IPC stream. metadata is attached to the
+    schema as JSON under the "metadata" key.
+    Raises ImportError when pyarrow is not installed.
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(frame.rename(columns=str), preserve_index=False)
+    if metadata:
+        schema_metadata = dict(table.schema.metadata or {})
+        schema_metadata[b"metadata"] = dumps(metadata)
+        table = table.replace_schema_metadata(schema_metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,338 @@
+"""
+Store of per-session analyses.
+Each session holds its cleaned DataFrame, result and columns. Sessions idle for
+longer than the TTL leave memory, as do the least recently used sessions once
+the DataFrames together exceed the memory budget. Sessions leaving memory are
+spilled to Arrow IPC files and reloaded on their next access.
+Spilling needs pyarrow; without it sessions leaving memory are dropped.
+
+In shared mode (for several server worker processes on one host) every new
+analysis is written to the spill directory straight away, so any worker can
+load any session, and in-memory copies are checked against the file so a
+session replaced by another worker is reloaded.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import orjson
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+SESSION_MEMORY_MB = int(os.environ.get("SESSION_MEMORY_MB", "1024"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+SESSION_SPILL_DIR = os.environ.get(
+    "SESSION_SPILL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_spill")
+)
+SESSION_SPILL_MAX_MB = int(os.environ.get("SESSION_SPILL_MAX_MB", "4096"))
+# On by default when uvicorn runs several workers (WEB_CONCURRENCY)
+SESSION_SHARED = os.environ.get(
+    "SESSION_SHARED", "1" if int(os.environ.get("WEB_CONCURRENCY", "1")) > 1 else "0"
+) == "1"
+
+# Analysis fields written alongside the spilled DataFrame
+SPILLED_FIELDS = ("result", "columns", "fingerprint")
+
+
+def analysis_size(analysis):
+    """Bytes held by an analysis, measured on its DataFrame."""
+    df = analysis.get("df")
+    if df is None:
+        return 0
+    return int(df.memory_usage(deep=True).sum())
+
+
+def write_spill_file(path, analysis):
+    """Write an analysis's DataFrame and SPILLED_FIELDS to an Arrow IPC file."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(analysis["df"])
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"analysis"] = dumps({field: analysis.get(field) for field in SPILLED_FIELDS})
+    table = table.replace_schema_metadata(metadata)
+
+    tmp_path = f"{path}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    # Renamed into place so readers never see a partial file
+    os.replace(tmp_path, path)
+
+
+def file_version(path):
+    """Identifies one write of a file (replacing a file changes its inode), or None when missing."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def read_spill_file(path):
+    """
+    Load an analysis written by write_spill_file. The file is memory-mapped,
+    so Arrow reads it without an intermediate buffer, but to_pandas() still
+    copies the columns into pandas-owned memory: the reloaded DataFrame does
+    not pin the mapping, and the file can be replaced or trimmed while the
+    session is in memory. Reloading costs about one DataFrame of memory.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    analysis = orjson.loads(table.schema.metadata[b"analysis"])
+    analysis["df"] = table.to_pandas()
+    analysis["chart_data"] = {}
+    return analysis
+
+
+class SessionStore:
+    """
+    Thread-safe LRU mapping of session ids to analyses, bounded by memory and
+    idle time, with a size-bounded on-disk tier for sessions leaving memory.
+    """
+
+    def __init__(self, max_bytes, ttl_seconds, spill_dir=None, spill_max_bytes=0, shared=False):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.shared = shared and bool(spill_dir)
+        self._sessions = OrderedDict()  # session id -> (analysis, size, last access)
+        self._spilling = {}  # session id -> analysis being written to disk
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.spills = 0
+        self.reloads = 0
+
+    def spill_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.arrow")
+
+    def get(self, session_id):
+        """
+        Return the session's analysis, reloading it from the spill tier when
+        it left memory, or None when the session is unknown.
+        """
+        now = time.monotonic()
+        with self._lock:
+            victims = self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                analysis, size, _ = entry
+                self._sessions[session_id] = (analysis, size, now)
+                self._sessions.move_to_end(session_id)
+                self.hits += 1
+            else:
+                analysis = self._spilling.get(session_id)
+        self._spill(victims)
+
+        if entry is not None:
+            if not self.shared:
+                return analysis
+            version = file_version(self.spill_path(session_id))
+            # A missing file holds no newer version than the one in memory
+            if version is None or analysis.get("spill_version") == version:
+                return analysis
+            # Replaced by another worker since this copy was loaded
+            analysis = None
+        if analysis is None:
+            analysis = self._reload(session_id)
+            if analysis is None:
+                with self._lock:
+                    self.misses += 1
+                return None
+        self._insert(session_id, analysis, discard_spill=False)
+        return analysis
+
+    def put(self, session_id, analysis):
+        if self.shared:
+            # Written through so every worker sees the new analysis
+            try:
+                self._write(session_id, analysis)
+            except Exception as exc:
+                logger.warning("Could not write shared session to disk: %s", exc)
+            self._insert(session_id, analysis, discard_spill=False)
+            self._trim_spill_dir()
+            return
+        self._insert(session_id, analysis, discard_spill=True)
+
+    def _write(self, session_id, analysis):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        path = self.spill_path(session_id)
+        write_spill_file(path, analysis)
+        analysis["spill_path"] = path
+        analysis["spill_version"] = file_version(path)
+
+    def _insert(self, session_id, analysis, discard_spill):
+        size = analysis_size(analysis)
+        now = time.monotonic()
+        with self._lock:
+            self._remove(session_id)
+            self._spilling.pop(session_id, None)
+            self._sessions[session_id] = (analysis, size, now)
+            self._size += size
+            victims = self._expire(now)
+            # The newest session is kept even when it alone exceeds the budget
+            while self._size > self.max_bytes and len(self._sessions) > 1:
+                oldest = next(iter(self._sessions))
+                evicted = self._remove(oldest)[0]
+                # Reachable through _spilling until written
+                self._spilling[oldest] = evicted
+                victims.append((oldest, evicted))
+                self.evictions += 1
+        if discard_spill and self.spill_dir:
+            # A new analysis replaces whatever the session spilled before
+            try:
+                os.remove(self.spill_path(session_id))
+            except FileNotFoundError:
+                pass
+        self._spill(victims)
+
+    def _remove(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._size -= entry[1]
+        return entry
+
+    def _expire(self, now):
+        """Remove sessions idle past the TTL and return them as (session id, analysis) pairs."""
+        expired = []
+        # Entries are in access order, so expired sessions are at the front
+        while self._sessions:
+            session_id, (analysis, _, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl_seconds:
+                break
+            self._remove(session_id)
+            expired.append((session_id, analysis))
+            self.expirations += 1
+        # Reachable through _spilling until written
+        self._spilling.update(expired)
+        return expired
+
+    def _spill(self, victims):
+        """Write sessions that left memory to the spill tier."""
+        if not victims:
+            return
+        with self._lock:
+            self._spilling.update(victims)
+        for session_id, analysis in victims:
+            try:
+                if self.spill_dir and analysis.get("df") is not None:
+                    path = self.spill_path(session_id)
+                    # Sessions loaded from or written to disk are already there
+                    if analysis.get("spill_path") != path or not os.path.exists(path):
+                        self._write(session_id, analysis)
+                    with self._lock:
+                        self.spills += 1
+            except Exception as exc:
+                logger.warning("Could not spill session to disk: %s", exc)
+            finally:
+                with self._lock:
+                    if self._spilling.get(session_id) is analysis:
+                        del self._spilling[session_id]
+        self._trim_spill_dir()
+
+    def _reload(self, session_id):
+        if not self.spill_dir:
+            return None
+        path = self.spill_path(session_id)
+        try:
+            version = file_version(path)
+            analysis = read_spill_file(path)
+            if not self.shared:
+                # Recency for trimming the spill tier. Shared files keep their
+                # write time, which other workers use to detect replacement.
+                os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            logger.warning("Could not reload spilled session: %s", exc)
+            return None
+        analysis["spill_path"] = path
+        analysis["spill_version"] = version
+        with self._lock:
+            self.reloads += 1
+        return analysis
+
+    def _spill_files(self):
+        try:
+            return [
+                (entry.path, entry.stat()) for entry in os.scandir(self.spill_dir)
+                if entry.is_file() and entry.name.endswith(".arrow")
+            ]
+        except (FileNotFoundError, TypeError):
+            return []
+
+    def _trim_spill_dir(self):
+        """
+        Remove the least recently used spill files until the tier fits its
+        budget. Files of sessions held in memory or used within the TTL are
+        kept, so the tier may stay over budget until they go idle.
+        """
+        files = self._spill_files()
+        total = sum(stat.st_size for _, stat in files)
+        if total <= self.spill_max_bytes:
+            return
+        with self._lock:
+            live = set(self._sessions) | set(self._spilling)
+        cutoff = time.time() - self.ttl_seconds
+        for path, stat in sorted(files, key=lambda item: item[1].st_mtime):
+            if total <= self.spill_max_bytes:
+                break
+            session_id = os.path.basename(path)[:-len(".arrow")]
+            if session_id in live or stat.st_mtime >= cutoff:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= stat.st_size
+
+    def __len__(self):
+        """Number of sessions held in memory."""
+        with self._lock:
+            victims = self._expire(time.monotonic())
+            count = len(self._sessions)
+        self._spill(victims)
+        return count
+
+    def stats(self):
+        spilled = [stat.st_size for _, stat in self._spill_files()]
+        with self._lock:
+            victims = self._expire(time.monotonic())
+            stats = {
+                "sessions": len(self._sessions),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "spilled_sessions": len(spilled),
+                "spill_bytes": sum(spilled),
+                "spill_max_bytes": self.spill_max_bytes,
+                "spills": self.spills,
+                "reloads": self.reloads,
+                "shared": self.shared,
+            }
+        self._spill(victims)
+        return stats
+
+
+sessions = SessionStore(
+    SESSION_MEMORY_MB * 1024 * 1024,
+    SESSION_TTL_SECONDS,
+    spill_dir=SESSION_SPILL_DIR,
+    spill_max_bytes=SESSION_SPILL_MAX_MB * 1024 * 1024,
+    shared=SESSION_SHARED,
+)
@@ -1,37 +1,40 @@
 import pandas as pd
 import numpy as np
+import asyncio
+import hashlib
+import json
 import os
 import logging
 
+from llm_client import llm
+from lru_cache import LRUCache
+from serialization import dumps
+
 logger = logging.getLogger(__name__)
 
+# Charts interpreted per LLM call
+INTERPRETATION_BATCH_SIZE = int(os.environ.get("INTERPRETATION_BATCH_SIZE", "6"))
+INTERPRETATION_CACHE_ENTRIES = int(os.environ.get("INTERPRETATION_CACHE_ENTRIES", "2000"))
+
 
 async def _get_llm_client():
-    """Get the Groq LLM client. Returns None if not configured."""
-    try:
-        from openai import AsyncOpenAI
-        api_key = os.environ.get("GROQ_API_KEY")
-        if not api_key:
-            return None
-        return AsyncOpenAI(api_key=api_key, base_url="https://api.groq.com/openai/v1")
-    except Exception:
-        return None
+    """Get the shared LLM client. Returns None if not configured."""
+    return llm if llm.configured else None
 
 
-async def _llm_generate(client, prompt, max_tokens=300):
+async def _llm_generate(client, prompt, max_tokens=300, **params):
     """Call the LLM and return the response text. Returns None on failure."""
     try:
-        response = await client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
+        response = await client.complete(
+            [
                 {"role": "system", "content": "You are a concise data analysis expert. Provide clear, actionable insights. Be specific with numbers. No markdown formatting."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.5,
             max_tokens=max_tokens,
-            stream=False
+            **params,
         )
-        return response.choices[0].message.content.strip()
+        return response.strip()
     except Exception as e:
         logger.warning(f"LLM call failed: {e}")
         return None
@@ -121,46 +124,117 @@ def _build_chart_data_summary(chart, df):
     return "\n".join(lines)
 
 
-async def generate_chart_interpretations(charts, df, column_types):
+# Chart spec fields that, with the dataset, determine a chart's data
+CHART_SPEC_FIELDS = (
+    "type", "x", "y", "column", "columns", "aggregation", "limit", "stackKey", "stackCategories",
+    "statistics", "correlation",
+)
+# Chart types whose rule-based interpretation reads the chart's data
+FALLBACK_DATA_TYPES = {"bar", "histogram", "horizontalBar", "pie", "donut", "boxPlot"}
+
+
+def chart_fingerprint(chart, dataset_fingerprint=None):
     """
-    Generate LLM-powered interpretations for each chart.
-    Falls back to rule-based interpretations if LLM is unavailable.
+    Identifies a chart's content: its spec and the fingerprint of the dataset
+    it is drawn from or, without one, a digest of its data.
     """
-    import asyncio
-    client = await _get_llm_client()
-    
-    tasks = []
-    for chart in charts:
-        if client:
-            data_summary = _build_chart_data_summary(chart, df)
-            prompt = (
-                f"Analyze this chart and write a 2-3 sentence interpretation that a business user would find useful.\n"
-                f"Mention the most important pattern, the key numbers, and one actionable takeaway.\n\n"
-                f"{data_summary}"
-            )
-            tasks.append(_llm_generate(client, prompt, max_tokens=200))
-        else:
-            tasks.append(asyncio.sleep(0, result=None)) # Placeholder
+    content = {key: chart.get(key) for key in CHART_SPEC_FIELDS}
+    if dataset_fingerprint:
+        content["dataset"] = dataset_fingerprint
+    else:
+        content["data"] = hashlib.sha256(dumps(chart.get("data") or [])).hexdigest()
+    return hashlib.sha256(dumps(content)).hexdigest()
 
-    llm_results = await asyncio.gather(*tasks)
-    
+
+# Identical charts across uploads reuse their interpretation
+interpretation_cache = LRUCache(max_entries=INTERPRETATION_CACHE_ENTRIES)
+
+
+def _interpretation(chart, text):
+    return {
+        "chart_title": chart.get("title", ""),
+        "chart_type": chart.get("type"),
+        "interpretation": text,
+    }
+
+
+def needs_chart_data(chart, dataset_fingerprint):
+    """
+    Whether the interpretation given with the upload reads the chart's data:
+    the chart has no cached LLM text and its rule-based text uses the data.
+    Data for the LLM prompt is built later, with the LLM call.
+    """
+    if chart.get("type") not in FALLBACK_DATA_TYPES:
+        return False
+    return not llm.configured or chart_fingerprint(chart, dataset_fingerprint) not in interpretation_cache
+
+
+def cached_chart_interpretations(charts, df, dataset_fingerprint=None):
+    """
+    Interpretations available without waiting for the LLM: cached LLM text, or
+    the rule-based fallback. Returns them with the indexes of the charts whose
+    LLM text is still to be generated (none when the LLM is not configured).
+    """
     interpretations = []
-    for i, chart in enumerate(charts):
-        title = chart.get("title", "")
-        chart_type = chart.get("type")
-        llm_text = llm_results[i]
-
-        # --- Fallback: rule-based ---
-        if not llm_text:
-            llm_text = _fallback_interpretation(chart, df)
-
-        interpretations.append({
-            "chart_title": title,
-            "chart_type": chart_type,
-            "interpretation": llm_text
-        })
-
-    return interpretations
+    pending = []
+    for idx, chart in enumerate(charts):
+        text = interpretation_cache.get(chart_fingerprint(chart, dataset_fingerprint)) if llm.configured else None
+        if text is None:
+            text = _fallback_interpretation(chart, df)
+            if llm.configured:
+                pending.append(idx)
+        interpretations.append(_interpretation(chart, text))
+    return interpretations, pending
+
+
+def _parse_batch_response(text, count):
+    """Map chart numbers (1-based) to text from a batched JSON response."""
+    try:
+        items = json.loads(text).get("interpretations", [])
+    except (ValueError, AttributeError):
+        return {}
+    texts = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        number, interpretation = item.get("chart"), item.get("text")
+        if isinstance(number, int) and 1 <= number <= count and isinstance(interpretation, str) and interpretation.strip():
+            texts[number] = interpretation.strip()
+    return texts
+
+
+async def _interpret_batch(client, charts, df):
+    """Interpret several charts with one LLM call. Returns texts aligned with charts (None where missing)."""
+    sections = [f"Chart {number}:\n{_build_chart_data_summary(chart, df)}" for number, chart in enumerate(charts, start=1)]
+    prompt = (
+        f"For each chart below, write a 2-3 sentence interpretation that a business user would find useful.\n"
+        f"Mention the most important pattern, the key numbers, and one actionable takeaway.\n"
+        f'Respond with JSON only, in the form {{"interpretations": [{{"chart": <chart number>, "text": "<interpretation>"}}]}}.\n\n'
+        + "\n\n".join(sections)
+    )
+    response = await _llm_generate(
+        client, prompt, max_tokens=200 * len(charts), response_format={"type": "json_object"}
+    )
+    texts = _parse_batch_response(response, len(charts)) if response else {}
+    return [texts.get(number) for number in range(1, len(charts) + 1)]
+
+
+async def llm_chart_interpretations(charts, df, dataset_fingerprint=None):
+    """
+    LLM interpretations of charts, INTERPRETATION_BATCH_SIZE charts per call
+    with the batches running concurrently. Returns texts aligned with charts,
+    None where the LLM gave none; the texts are cached by chart fingerprint.
+    """
+    client = await _get_llm_client()
+    if not client or not charts:
+        return [None] * len(charts)
+    batches = [charts[start:start + INTERPRETATION_BATCH_SIZE] for start in range(0, len(charts), INTERPRETATION_BATCH_SIZE)]
+    results = await asyncio.gather(*(_interpret_batch(client, batch, df) for batch in batches))
+    texts = [text for batch in results for text in batch]
+    for chart, text in zip(charts, texts):
+        if text:
+            interpretation_cache.put(chart_fingerprint(chart, dataset_fingerprint), text)
+    return texts
 
 
 def _fallback_interpretation(chart, df):
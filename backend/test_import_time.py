@@ -0,0 +1,54 @@
+"""
+Measures the cold import time of the API module (what every worker spawn pays).
+Plotting, ML, document and LLM libraries must be loaded on first use, not at import.
+
+Run: python test_import_time.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Heavy dependencies that importing main must not pull in
+DEFERRED_MODULES = [
+    "matplotlib", "seaborn", "sklearn", "scipy", "fpdf",
+    "PyPDF2", "docx", "openpyxl", "openai",
+]
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "3.0"))
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_import():
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def test_import_time():
+    result = measure_import()
+    loaded = set(result["modules"])
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+
+    assert not eager, f"Imported at start-up: {', '.join(eager)}"
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS, (
+        f"Importing main took {result['seconds']:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"
+    )
+    return result["seconds"]
+
+
+if __name__ == "__main__":
+    seconds = test_import_time()
+    print(f"Importing main took {seconds:.2f}s; no deferred modules loaded.")
@@ -1,7 +1,7 @@
 import pandas as pd
 import numpy as np
 from report_generator import generate_pdf_report
-import os
+from chart_image_cache import chart_images
 
 # Create dummy data
 df = pd.DataFrame({
@@ -38,24 +38,26 @@ analysis_results = {
     }
 }
 
-try:
-    print("Generating PDF...")
-    pdf_bytes = generate_pdf_report(analysis_results, df, columns)
-    
-    with open("test_report_with_charts.pdf", "wb") as f:
-        f.write(pdf_bytes)
+# Report charts render in spawned worker processes, which re-import this script
+if __name__ == "__main__":
+    try:
+        print("Generating PDF...")
+        pdf_bytes = generate_pdf_report(analysis_results, df, columns)
         
-    print(f"PDF generated successfully. Size: {len(pdf_bytes)} bytes")
-    
-    # Check if temp_charts is empty (cleanup verification)
-    if os.path.exists("temp_charts") and not os.listdir("temp_charts"):
-        print("Cleanup successful: temp_charts is empty.")
-    elif not os.path.exists("temp_charts"):
-        print("Cleanup successful: temp_charts directory removed (or empty).")
-    else:
-        print("Warning: temp_charts not empty.")
+        with open("test_report_with_charts.pdf", "wb") as f:
+            f.write(pdf_bytes)
+            
+        print(f"PDF generated successfully. Size: {len(pdf_bytes)} bytes")
+        
+        # A second report for the same data should reuse the cached chart images
+        misses = chart_images.stats()["misses"]
+        generate_pdf_report(analysis_results, df, columns)
+        if chart_images.stats()["misses"] == misses:
+            print("Chart images reused from cache.")
+        else:
+            print("Warning: charts were re-rendered for the second report.")
 
-except Exception as e:
-    print(f"Error: {e}")
-    import traceback
-    traceback.print_exc()
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
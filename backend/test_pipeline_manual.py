@@ -4,6 +4,7 @@ from main import upload_file
 import asyncio
 from fastapi import UploadFile
 import io
+import json
 
 # Create a sample dataframe with various issues
 df = pd.DataFrame({
@@ -24,7 +25,7 @@ csv_content = df.to_csv(index=False).encode('utf-8')
 
 async def test():
     file = UploadFile(filename="test.csv", file=io.BytesIO(csv_content))
-    response = await upload_file(file)
+    response = json.loads((await upload_file(file)).body)
     
     if "error" in response:
         print("Error:", response["error"])
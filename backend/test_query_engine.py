@@ -0,0 +1,81 @@
+"""
+Checks that the chat query engine answers computational questions exactly
+from the full DataFrame and leaves open-ended questions to the LLM.
+
+Run from the backend directory: python test_query_engine.py
+"""
+import numpy as np
+import pandas as pd
+
+from query_engine import QueryEngine
+
+
+def sample_engine():
+    rng = np.random.default_rng(0)
+    n = 10_000
+    df = pd.DataFrame({
+        "price": rng.random(n) * 100,
+        "unit_price": rng.random(n),
+        "qty": rng.integers(0, 50, n),
+        "city": rng.choice(["Paris", "London", "Berlin"], n),
+        "product": rng.choice(["pen", "ink", "pad"], n),
+        "rating": rng.choice(["poor", "fair", "great"], n),
+    })
+    columns = {"numeric": ["price", "unit_price", "qty"], "categorical": ["city", "product", "rating"], "datetime": []}
+    return df, QueryEngine(df, columns)
+
+
+def run():
+    df, engine = sample_engine()
+
+    answer = engine.answer("What is the average price?")
+    assert f"{df['price'].mean():,.2f}" in answer, answer
+
+    answer = engine.answer("average unit price in Paris")
+    expected = df.loc[df["city"] == "Paris", "unit_price"].mean()
+    assert f"{expected:,.2f}" in answer, answer
+
+    answer = engine.answer("how many rows have qty over 40")
+    assert f"{(df['qty'] > 40).sum():,} of {len(df):,}" in answer, answer
+
+    answer = engine.answer("Which city has the highest total qty?")
+    best = df.groupby("city")["qty"].sum().idxmax()
+    assert best in answer and "more" in answer, answer
+
+    assert engine.route("top 2 city by average price")[2]["n"] == 2
+    assert engine.route("top 3 city by total qty")[2]["n"] == 3
+    assert engine.route("average price where qty is between 10 and 20")[0] == "aggregate"
+    assert engine.route("how many rows have qty not equal to 5")[0] == "row_count"
+    assert engine.route("is there a correlation between price and qty")[0] == "correlation"
+    assert engine.route("any missing values?")[0] == "missing"
+    assert engine.route("which city has the most rows")[2] == {"by": "city", "n": 1, "ascending": False}
+    assert engine.route("most common product")[0] == "top_values"
+
+    for question in (
+        "Why is price so high?",
+        "What are the key patterns in this dataset?",
+        "how many rows with more than 5 items",  # condition on no known column
+        "Tell me about the data",
+        # Negations, contrasts and numbers no parsed condition explains
+        "what is the average price not in Paris",
+        "What is the average price? ignore rows where qty is 0",
+        "average price in 2021",
+        "Is the average price higher in Paris than London?",
+        "max qty in London vs Berlin",
+        "average price for year 2021",
+        # Measures that resolve to no numeric column are not row counts
+        "which city has the highest average rating",
+        "which product sells the most",
+        "which city has the most sales",
+        # Several aggregates or groupings at once
+        "min and max price",
+        "average price per city per product",
+        "count rows by city and product",
+    ):
+        assert engine.answer(question) is None, question
+
+    print("Query engine checks passed.")
+
+
+if __name__ == "__main__":
+    run()
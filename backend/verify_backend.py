@@ -4,8 +4,11 @@ import asyncio
 import time
 from main import upload_file
 from database import SessionLocal, AnalysisResult, init_db
+from persistence import persistence
+from sqlalchemy import select
 from fastapi import UploadFile
 import io
+import json
 import os
 
 # Set dummy API key for testing if not present
@@ -14,7 +17,7 @@ if not os.environ.get("GROQ_API_KEY"):
 
 async def test_verification():
     # Initialize DB
-    init_db()
+    await init_db()
     
     # Create sample data
     df = pd.DataFrame({
@@ -30,7 +33,7 @@ async def test_verification():
     
     # This will trigger 1 conclusion + 2 chart interprets (Histogram + Pie/Box)
     # Total 3 LLM calls. In parallel it should take ~ as long as 1.
-    response = await upload_file(file)
+    response = json.loads((await upload_file(file)).body)
     
     duration = time.time() - start_time
     print(f"Processing took: {duration:.2f} seconds")
@@ -40,17 +43,18 @@ async def test_verification():
         # Note: it might error if the key is invalid, which is expected for local test
         return
 
-    # Check database
-    db = SessionLocal()
-    last_analysis = db.query(AnalysisResult).order_by(AnalysisResult.id.desc()).first()
+    # Check database once the write-behind queue has saved the analysis
+    await persistence.flush()
+    async with SessionLocal() as db:
+        last_analysis = (await db.execute(
+            select(AnalysisResult).order_by(AnalysisResult.id.desc()).limit(1)
+        )).scalar_one_or_none()
     
     if last_analysis:
         print(f"Successfully saved to DB! ID: {last_analysis.id}, Filename: {last_analysis.filename}")
-        print(f"Data preview size: {len(last_analysis.data_preview)} rows")
+        print(f"Stored sections: {last_analysis.result_data.get('sections')}")
     else:
         print("FAILED to save to database")
-    
-    db.close()
 
 if __name__ == "__main__":
     asyncio.run(test_verification())
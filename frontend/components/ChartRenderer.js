@@ -1,4 +1,4 @@
-import { LineChart, Line, BarChart, Bar, ScatterChart, Scatter, PieChart, Pie, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, Cell, AreaChart, Area, ComposedChart, ReferenceLine } from 'recharts';
+import { LineChart, Line, BarChart, Bar, ScatterChart, Scatter, PieChart, Pie, XAxis, YAxis, ZAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer, Cell, AreaChart, Area, ComposedChart, ReferenceLine } from 'recharts';
 
 const COLORS = ['#8b5cf6', '#ec4899', '#3b82f6', '#10b981', '#f59e0b', '#ef4444', '#6366f1', '#14b8a6', '#f97316', '#06b6d4'];
 
@@ -15,7 +15,7 @@ const getHeatmapColor = (value) => {
 };
 
 export default function ChartRenderer({ chart, data }) {
-    const { type, x, y, title, data: customData, statistics, correlation, stackCategories } = chart;
+    const { type, x, y, title, data: customData, statistics, correlation, stackCategories, mode, outliers } = chart;
 
     // Use custom data (pre-aggregated/binned from backend) if available
     const chartData = customData || ((() => {
@@ -251,7 +251,18 @@ export default function ChartRenderer({ chart, data }) {
                                 }}
                             />
                             <Legend />
-                            <Scatter name={`${x} vs ${y}`} data={chartData} fill="#8b5cf6" />
+                            {mode === 'binned' ? (
+                                <>
+                                    {/* Density grid: each point is a bin center sized by its row count */}
+                                    <ZAxis type="number" dataKey="count" name="count" range={[20, 400]} />
+                                    <Scatter name={`${x} vs ${y} (density)`} data={chartData} fill="#8b5cf6" fillOpacity={0.6} />
+                                    {outliers && outliers.length > 0 && (
+                                        <Scatter name="Outliers" data={outliers} fill="#ef4444" />
+                                    )}
+                                </>
+                            ) : (
+                                <Scatter name={`${x} vs ${y}`} data={chartData} fill="#8b5cf6" />
+                            )}
                         </ScatterChart>
                     </ResponsiveContainer>
                 );
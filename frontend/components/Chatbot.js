@@ -73,36 +73,62 @@ export default function Chatbot({ isOpen, onToggle, sessionId }) {
         setInput('');
         setIsLoading(true);
 
+        // Filled in as the answer streams in
+        const showAnswer = (content, isError = false) => {
+            setMessages(prev => {
+                const last = prev[prev.length - 1];
+                const answer = { role: 'assistant', content, isError, streaming: true };
+                return last?.streaming ? [...prev.slice(0, -1), answer] : [...prev, answer];
+            });
+        };
+
         try {
-            const response = await axios.post(`${API_URL}/chat`, {
-                message: messageText,
-                history: messages.slice(-10) // Send last 10 messages for context
-            }, {
+            const response = await fetch(`${API_URL}/chat/stream`, {
+                method: 'POST',
                 headers: {
+                    'Content-Type': 'application/json',
                     'X-Session-Id': sessionId,
                 },
+                body: JSON.stringify({
+                    message: messageText,
+                    history: messages.slice(-10) // Send last 10 messages for context
+                }),
             });
+            if (!response.ok) {
+                throw new Error(`Chat request failed with status ${response.status}`);
+            }
 
-            if (response.data.error) {
-                setMessages(prev => [...prev, {
-                    role: 'assistant',
-                    content: `Sorry, I encountered an error: ${response.data.error}`,
-                    isError: true
-                }]);
-            } else {
-                setMessages(prev => [...prev, {
-                    role: 'assistant',
-                    content: response.data.response
-                }]);
+            // Server-sent events: "delta" events carry text, then "done" or "error"
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let answer = '';
+            let finished = false;
+            while (!finished) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split('\n\n');
+                buffer = events.pop();
+                for (const raw of events) {
+                    const event = raw.match(/^event: (.*)$/m)?.[1];
+                    const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}');
+                    if (event === 'delta') {
+                        answer += data.text;
+                        showAnswer(answer);
+                    } else if (event === 'error') {
+                        showAnswer(`Sorry, I encountered an error: ${data.message}`, true);
+                        finished = true;
+                    } else if (event === 'done') {
+                        finished = true;
+                    }
+                }
             }
         } catch (error) {
             console.error('Chat error:', error);
-            setMessages(prev => [...prev, {
-                role: 'assistant',
-                content: 'Sorry, I could not process your request. Please make sure you have uploaded a dataset and try again.',
-                isError: true
-            }]);
+            showAnswer('Sorry, I could not process your request. Please make sure you have uploaded a dataset and try again.', true);
         } finally {
+            setMessages(prev => prev.map(msg => (msg.streaming ? { ...msg, streaming: false } : msg)));
             setIsLoading(false);
         }
     };
@@ -211,7 +237,7 @@ export default function Chatbot({ isOpen, onToggle, sessionId }) {
                                 </motion.div>
                             ))}
 
-                            {isLoading && (
+                            {isLoading && !messages[messages.length - 1]?.streaming && (
                                 <motion.div
                                     className={`${styles.message} ${styles.assistant}`}
                                     initial={{ opacity: 0 }}
@@ -1,5 +1,6 @@
+import { useEffect, useState } from 'react';
 import { motion } from 'framer-motion';
-import ChartRenderer from './ChartRenderer';
+import LazyChart from './LazyChart';
 import styles from '../styles/Dashboard.module.css';
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
@@ -61,8 +62,30 @@ function highlightKeyTerms(text) {
 }
 
 export default function Dashboard({ data, onReset }) {
-    const { summary, insights, recommended_charts, columns, cleaning_report, dataset_summary, chart_interpretations, conclusion } = data;
+    const { summary, insights, recommended_charts, columns, cleaning_report, dataset_summary, conclusion } = data;
     const sessionId = data?.session_id;
+    const [chart_interpretations, setChartInterpretations] = useState(data.chart_interpretations);
+
+    // Rule-based interpretations come with the upload; AI-written ones follow
+    useEffect(() => {
+        setChartInterpretations(data.chart_interpretations);
+        if (!data.interpretations_pending || !sessionId) return;
+
+        let cancelled = false;
+        fetch(`${API_URL}/charts/interpretations?wait=30`, {
+            headers: { 'X-Session-Id': sessionId },
+        })
+            .then(response => (response.ok ? response.json() : null))
+            .then(body => {
+                if (!cancelled && body?.chart_interpretations) {
+                    setChartInterpretations(body.chart_interpretations);
+                }
+            })
+            .catch(error => console.error('Failed to fetch chart interpretations:', error));
+        return () => {
+            cancelled = true;
+        };
+    }, [data, sessionId]);
 
     // Extract key metrics from summary
     const getKeyMetrics = () => {
@@ -288,7 +311,7 @@ export default function Dashboard({ data, onReset }) {
                         transition={{ delay: 0.5 + idx * 0.1 }}
                     >
                         <h4>{chart.title}</h4>
-                        <ChartRenderer chart={chart} data={data.data} />
+                        <LazyChart chart={chart} data={data.data} sessionId={sessionId} />
 
                         {/* Chart Interpretation */}
                         {chart_interpretations && chart_interpretations.find(ci => ci.chart_title === chart.title) && (
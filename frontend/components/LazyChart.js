@@ -0,0 +1,66 @@
+import { useEffect, useRef, useState } from 'react';
+import axios from 'axios';
+import ChartRenderer from './ChartRenderer';
+
+const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
+
+/**
+ * Renders a recommended chart, fetching its data from the backend the first
+ * time the chart scrolls into view. Charts that already carry their data
+ * (analyses saved before lazy loading) render immediately, and image charts
+ * load their rendered PNG from the backend by URL.
+ */
+export default function LazyChart({ chart, data, sessionId }) {
+    const containerRef = useRef(null);
+    const isReady = Boolean(chart.data) || chart.type === 'image';
+    const readyChart = chart.type === 'image' && chart.imageUrl
+        ? { ...chart, imageData: `${API_URL}${chart.imageUrl}?session_id=${encodeURIComponent(sessionId || '')}` }
+        : chart;
+    const [loadedChart, setLoadedChart] = useState(isReady ? readyChart : null);
+    const [error, setError] = useState(null);
+
+    useEffect(() => {
+        if (loadedChart || !chart.id || !sessionId || !containerRef.current) return;
+
+        let cancelled = false;
+        const loadChartData = async () => {
+            try {
+                const response = await axios.get(`${API_URL}/charts/${encodeURIComponent(chart.id)}/data`, {
+                    headers: {
+                        'X-Session-Id': sessionId,
+                    },
+                });
+                if (!cancelled) setLoadedChart({ ...chart, ...response.data });
+            } catch (err) {
+                if (!cancelled) setError('Failed to load chart data');
+                console.error(err);
+            }
+        };
+
+        const observer = new IntersectionObserver((entries) => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                observer.disconnect();
+                loadChartData();
+            }
+        }, { rootMargin: '200px' });
+        observer.observe(containerRef.current);
+
+        return () => {
+            cancelled = true;
+            observer.disconnect();
+        };
+    }, [chart, loadedChart, sessionId]);
+
+    if (loadedChart) {
+        return <ChartRenderer chart={loadedChart} data={data} />;
+    }
+
+    return (
+        <div
+            ref={containerRef}
+            style={{ height: 300, display: 'flex', alignItems: 'center', justifyContent: 'center', color: '#9ca3af' }}
+        >
+            {error || 'Loading chart...'}
+        </div>
+    );
+}